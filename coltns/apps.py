@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ColtnsConfig(AppConfig):
     name = 'coltns'
+
+    def ready(self):
+        from . import signals  # connects the model signal handlers
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F
+
+from coltns.membership import recount_wines
+from coltns.models import ClientCollection, ProviderCollection
+
+# collection model -> membership reverse relation
+COLLECTIONS = {
+    ProviderCollection: 'providercollectionwine',
+    ClientCollection: 'clientcollectionwine',
+}
+
+
+class Command(BaseCommand):
+    help = "Reset the collections' wines_count from live COUNT queries, or check them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report collections whose stored count differs from the live one')
+
+    def handle(self, *args, **options):
+        drift = []
+        for model, relation in COLLECTIONS.items():
+            rows = (
+                model.objects.annotate(live=Count(relation)).exclude(wines_count=F('live'))
+                .values_list('id', 'collection_name', 'wines_count', 'live')
+            )
+            drift.extend((model, *row) for row in rows)
+
+        for model, pk, name, stored, live in drift:
+            self.stdout.write(f'{model.__name__} {pk} ({name}): stored {stored}, live {live}')
+            if not options['check']:
+                recount_wines(model, pk)  # counts again in the UPDATE: rows may have changed since the read
+
+        if options['check'] and drift:
+            raise CommandError(f'{len(drift)} collection counts differ from the live data.')
+        if drift:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} collection counts.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All collection counts are consistent.'))
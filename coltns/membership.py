@@ -0,0 +1,131 @@
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from wines.dashboard import invalidate_provider_dashboards
+from wines.models import Wine
+from .models import ClientCollection, ClientCollectionWine, ProviderCollection, ProviderCollectionWine
+
+# collection model -> (membership model, collection foreign key name)
+MEMBERSHIPS = {
+    ClientCollection: (ClientCollectionWine, 'client_collection'),
+    ProviderCollection: (ProviderCollectionWine, 'provider_collection'),
+}
+
+# Set while CollectionWines deletes a batch; the per-row membership signals skip their work
+_in_batch = ContextVar('collection_wines_batch', default=False)
+
+
+def in_batch():
+    return _in_batch.get()
+
+
+def change_wines_count(collection_model, collection_id, delta):
+    """
+    Move the collection's wines_count with an atomic F() update and touch updated_at,
+    since wines_count is part of the collection payload.
+    """
+    values = {'updated_at': timezone.now()}
+    if delta:
+        values['wines_count'] = F('wines_count') + delta
+    collection_model.objects.filter(pk=collection_id).update(**values)
+
+
+def recount_wines(collection_model, collection_id):
+    """Set wines_count from the membership rows in one UPDATE and touch updated_at."""
+    model, field = MEMBERSHIPS[collection_model]
+    count = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk')).values('count')
+    collection_model.objects.filter(pk=collection_id).update(
+        wines_count=Coalesce(Subquery(count), 0), updated_at=timezone.now(),
+    )
+
+
+class CollectionWines:
+    """
+    Set operations on the wines of one collection, a few queries per call whatever the
+    number of ids. Each call locks the collection row, so concurrent calls on the same
+    collection see each other's changes, and recounts wines_count from the rows inside its
+    transaction rather than trusting the ids it computed: bulk_create(ignore_conflicts=True)
+    may insert fewer rows than asked when a single-row add races it.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.model, self.field = MEMBERSHIPS[type(collection)]
+
+    def members(self):
+        return self.model.objects.filter(**{self.field: self.collection})
+
+    def current(self, wine_ids=None):
+        members = self.members()
+        if wine_ids is not None:
+            members = members.filter(wine_id__in=wine_ids)
+        return set(members.values_list('wine_id', flat=True))
+
+    def lock(self):
+        type(self.collection).objects.select_for_update().filter(pk=self.collection.pk).exists()
+
+    def delete(self, wine_ids):
+        """
+        Delete the memberships of `wine_ids`. The post_delete signals still fire but skip
+        the counter and dashboard work, which changed() does once for the whole batch.
+        """
+        if not wine_ids:
+            return
+        token = _in_batch.set(True)
+        try:
+            self.members().filter(wine_id__in=wine_ids).delete()
+        finally:
+            _in_batch.reset(token)
+
+    @staticmethod
+    def existing_wines(wine_ids):
+        return set(Wine.objects.filter(id__in=wine_ids).order_by().values_list('id', flat=True))
+
+    def add(self, wine_ids):
+        """Add the wines that are not members yet. Returns the added ids."""
+        with transaction.atomic():
+            self.lock()
+            added = sorted(set(wine_ids) - self.current(wine_ids))
+            self.model.objects.bulk_create(
+                [self.model(**{self.field: self.collection}, wine_id=wine_id) for wine_id in added],
+                ignore_conflicts=True,
+            )
+            self.changed(added, [])
+        return added
+
+    def remove(self, wine_ids):
+        """Remove the wines that are members. Returns the removed ids."""
+        with transaction.atomic():
+            self.lock()
+            removed = sorted(self.current(wine_ids))
+            self.delete(removed)
+            self.changed([], removed)
+        return removed
+
+    def replace(self, wine_ids):
+        """Make the membership exactly `wine_ids`. Returns (added, removed) ids."""
+        wine_ids = set(wine_ids)
+        with transaction.atomic():
+            self.lock()
+            current = self.current()
+            added, removed = sorted(wine_ids - current), sorted(current - wine_ids)
+            self.delete(removed)
+            self.model.objects.bulk_create(
+                [self.model(**{self.field: self.collection}, wine_id=wine_id) for wine_id in added],
+                ignore_conflicts=True,
+            )
+            self.changed(added, removed)
+        return added, removed
+
+    def changed(self, added, removed):
+        """Counter, timestamp and dashboard bookkeeping that the per-row signals would do."""
+        if not added and not removed:
+            return
+        recount_wines(type(self.collection), self.collection.pk)
+        invalidate_provider_dashboards(
+            Wine.objects.filter(id__in=[*added, *removed]).order_by().values_list('provider_id', flat=True).distinct()
+        )
@@ -1,16 +1,36 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Lower
 from users.models import User
 from wines.models import Wine
 
 # Create your models here.
 # Define the models for the collections app
 
+COLLECTION_NAME_SCOPE = getattr(settings, 'COLLECTION_NAME_UNIQUE_SCOPE', 'global') # 'global' or 'owner'
+
+
+def collection_name_constraint(owner_field, name):
+    """Case-insensitive unique collection name, across the table or per owner depending on COLLECTION_NAME_UNIQUE_SCOPE."""
+    expressions = [Lower('collection_name')]
+    if COLLECTION_NAME_SCOPE == 'owner':
+        expressions.append(models.F(owner_field))
+    return models.UniqueConstraint(*expressions, name=name, violation_error_message='Collection name already exists.')
+
+
 class ProviderCollection(models.Model):
     collection_name = models.CharField(max_length=100)
     description = models.TextField()
     registration_date = models.DateField(auto_now_add=True) # Date when the collection was created
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the collection was last modified
+    wines_count = models.PositiveIntegerField(default=0, editable=False) # Maintained by the membership signals, see reconcile_collection_counts
     provider = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'provider'}, null=True, blank=True) # Foreign key relationship to User model with provider role
     type = models.ForeignKey('Type', on_delete=models.CASCADE, null=True, blank=True) # Foreign key relationship to Type model
+
+    class Meta:
+        constraints = [
+            collection_name_constraint('provider', 'unique_provider_collection_name'),
+        ]
     
     def __str__(self):
         return self.collection_name # Return the collection name as the string representation of the ProviderCollection model
@@ -20,7 +40,14 @@ class ClientCollection(models.Model):
     collection_name = models.CharField(max_length=100)
     description = models.TextField()
     registration_date = models.DateField(auto_now_add=True) # Date when the collection was created
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the collection was last modified
+    wines_count = models.PositiveIntegerField(default=0, editable=False) # Maintained by the membership signals, see reconcile_collection_counts
     client = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'client'}, null=True, blank=True) # Foreign key relationship to User model with client role
+
+    class Meta:
+        constraints = [
+            collection_name_constraint('client', 'unique_client_collection_name'),
+        ]
     
     def __str__(self):
         return self.collection_name # Return the collection name as the string representation of the ClientCollection model    
@@ -29,6 +56,7 @@ class ClientCollection(models.Model):
 class Type(models.Model):
     type_name = models.CharField(max_length=50)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the type was last modified
     
     def __str__(self):
         return f"{self.id} - {self.type_name}" # Return the type name as the string representation of the Type model
@@ -38,10 +66,28 @@ class ClientCollectionWine(models.Model):
     client_collection = models.ForeignKey(ClientCollection, on_delete=models.CASCADE) # Foreign key relationship to ClientCollection model
     wine = models.ForeignKey(Wine, on_delete=models.CASCADE) # Foreign key relationship to Wine model
     added_date = models.DateField(auto_now_add=True) # Date when the wine was added to the client's collection
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the entry was last modified
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client_collection', 'wine'], name='unique_client_collection_wine'),
+        ]
+        indexes = [
+            models.Index(fields=['client_collection', 'added_date', 'id'], name='client_collection_added_idx'), # Index for collection contents pagination
+        ]
     
     
 class ProviderCollectionWine(models.Model):
     provider_collection = models.ForeignKey(ProviderCollection, on_delete=models.CASCADE) # Foreign key relationship to ProviderCollection model
     wine = models.ForeignKey(Wine, on_delete=models.CASCADE) # Foreign key relationship to Wine model
     added_date = models.DateField(auto_now_add=True) # Date when the wine was added to the provider's collection
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the entry was last modified
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider_collection', 'wine'], name='unique_provider_collection_wine'),
+        ]
+        indexes = [
+            models.Index(fields=['provider_collection', 'added_date', 'id'], name='provider_collection_added_idx'), # Index for collection contents pagination
+        ]
     
\ No newline at end of file
@@ -0,0 +1,10 @@
+from wines.pagination import KeysetPagination
+
+
+class CollectionWinesPagination(KeysetPagination):
+    """
+    Keyset pagination for collection contents, newest additions first, with id as a
+    tiebreaker. The cursor carries both values, so rows added on the same day page
+    without OFFSET. Backed by the (collection, added_date, id) index on the membership tables.
+    """
+    ordering = ('-added_date', '-id')
@@ -18,7 +18,8 @@ class IsProviderCollectionOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff or request.user.is_superuser:
             return True
-        return obj.provider == request.user
+        # Compare ids: no query for the related user
+        return obj.provider_id == request.user.id
 
 class IsClientCollectionOwner(BasePermission):
     message = "You do not own this client collection."
@@ -26,7 +27,7 @@ class IsClientCollectionOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff or request.user.is_superuser:
             return True
-        return obj.client == request.user
+        return obj.client_id == request.user.id
 
 
 class IsClientCollectionWineOwner(BasePermission):
@@ -35,7 +36,8 @@ class IsClientCollectionWineOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff or request.user.is_superuser:
             return True
-        return obj.client_collection.client == request.user
+        # client_collection is select_related by the viewset
+        return obj.client_collection.client_id == request.user.id
 
 class IsProviderCollectionWineOwner(BasePermission):
     message = "You do not own this provider collection wine."
@@ -43,7 +45,7 @@ class IsProviderCollectionWineOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff or request.user.is_superuser:
             return True
-        return obj.provider_collection.provider == request.user
+        return obj.provider_collection.provider_id == request.user.id
 
 class CanViewProviderCollection(BasePermission):
 
@@ -69,5 +71,7 @@ class CanViewProviderCollection(BasePermission):
         if user.role == "client":
             return True
         if user.role == "provider":
-            return obj.provider == user
+            # Collection or collection wine
+            collection = getattr(obj, 'provider_collection', obj)
+            return collection.provider_id == user.id
         return False
\ No newline at end of file
@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from .models import ClientCollection,ProviderCollection,ClientCollectionWine,ProviderCollectionWine,Type
 from wines.serializer import WineReadSerializer, WineWriteSerializer
@@ -15,15 +16,35 @@ class ProviderCollectionReadSerializer(serializers.ModelSerializer):
     """Serializer for reading ProviderCollection data."""
     type = TypeSerializer(read_only=True)
     provider = serializers.SlugRelatedField(slug_field='username', read_only=True)
-    wines_count = serializers.SerializerMethodField()
     
     class Meta:
         model = ProviderCollection
         fields = ['id', 'collection_name', 'description', 'registration_date', 'provider', 'type', 'wines_count']
-    def get_wines_count(self, obj):
-        return obj.providercollectionwine_set.count()
         
-class ProviderCollectionWriteSerializer(serializers.ModelSerializer):
+class UniqueCollectionNameMixin:
+    """
+    Collection names are unique through a database constraint (see collection_name_constraint);
+    a violation is reported as a collection_name validation error instead of a pre-check query.
+    """
+    unique_name_constraint = None
+
+    def save_unique(self, save, *args):
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError as error:
+            if self.unique_name_constraint not in str(error):
+                raise
+            raise serializers.ValidationError({'collection_name': ["Collection name already exists."]})
+
+    def create(self, validated_data):
+        return self.save_unique(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self.save_unique(super().update, instance, validated_data)
+
+
+class ProviderCollectionWriteSerializer(UniqueCollectionNameMixin, serializers.ModelSerializer):
     """Serializer for creating and updating ProviderCollection data."""
     type_id = serializers.PrimaryKeyRelatedField(
         queryset=Type.objects.all(),
@@ -35,47 +56,36 @@ class ProviderCollectionWriteSerializer(serializers.ModelSerializer):
         model = ProviderCollection
         fields = ['id', 'collection_name', 'description', 'provider_id', 'type_id', 'registration_date']
         read_only_fields = ['id', 'registration_date']
+    unique_name_constraint = 'unique_provider_collection_name'
         
     def validate_collection_name(self, value):
-        """Validate name collection."""
+        """Validate name collection. Uniqueness is enforced by the database."""
         if not value or not value.strip():
             raise serializers.ValidationError("Collection name cannot be empty.")
-        if ProviderCollection.objects.filter(collection_name=value).exists():
-            raise serializers.ValidationError("Collection name already exists.")
         return value
-    def create(self, validated_data):
-        return ProviderCollection.objects.create(**validated_data)
    
         
 class ClientCollectionReadSerializer(serializers.ModelSerializer):
     """Serializer for reading ClientCollection data."""
     client = serializers.SlugRelatedField(slug_field='username', read_only=True)
-    wines_count = serializers.SerializerMethodField()
     class Meta:
         model = ClientCollection
         fields = ['id', 'collection_name', 'description', 'registration_date', 'client', 'wines_count']
         
-    def get_wines_count(self, obj):
-        return obj.clientcollectionwine_set.count()
-        
-class ClientCollectionWriteSerializer(serializers.ModelSerializer):
+class ClientCollectionWriteSerializer(UniqueCollectionNameMixin, serializers.ModelSerializer):
     """Serializer for creating and updating ClientCollection data."""
         
     class Meta:
         model = ClientCollection
         fields = ['id', 'collection_name', 'description', 'client_id', 'registration_date']
         read_only_fields = ['id', 'registration_date']
+    unique_name_constraint = 'unique_client_collection_name'
         
     def validate_collection_name(self, value):
-        """Validate name collection."""
+        """Validate name collection. Uniqueness is enforced by the database."""
         if not value or not value.strip():
             raise serializers.ValidationError("Collection name cannot be empty.")
-        if ClientCollection.objects.filter(collection_name=value).exists():
-            raise serializers.ValidationError("Collection name already exists.")
         return value
-    
-    def create(self, validated_data):
-        return ClientCollection.objects.create(**validated_data)    
         
 class ClientCollectionWineSerializer(serializers.ModelSerializer):
     """Serializer for ClientCollectionWine model."""
@@ -97,6 +107,12 @@ class ClientCollectionWineSerializer(serializers.ModelSerializer):
         fields = ['id', 'client_collection', 'wine', 'wine_id', 'client_collection_id', 'added_date']
         read_only_fields = ['id', 'added_date', 'client_collection', 'wine']
         
+    def validate_client_collection_id(self, value):
+        request = self.context.get('request')
+        if request is not None and value.client_id != request.user.id:
+            raise serializers.ValidationError("You do not own this client collection.")
+        return value
+
     def validate(self, data): 
         wine = data.get('wine')
         client_collection = data.get('client_collection')
@@ -127,6 +143,12 @@ class ProviderCollectionWineSerializer(serializers.ModelSerializer):
         fields = ['id', 'provider_collection', 'wine', 'wine_id', 'provider_collection_id', 'added_date']
         read_only_fields = ['id', 'added_date', 'provider_collection', 'wine']
      
+    def validate_provider_collection_id(self, value):
+        request = self.context.get('request')
+        if request is not None and value.provider_id != request.user.id:
+            raise serializers.ValidationError("You do not own this provider collection.")
+        return value
+
     def validate(self, data): # Validate no duplicate wines in the same collection
         wine = data.get('wine')
         provider_collection = data.get('provider_collection')
@@ -0,0 +1,53 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from wines.dashboard import invalidate_wine_dashboard
+from .membership import change_wines_count, in_batch
+from .models import ClientCollection, ClientCollectionWine, ProviderCollection, ProviderCollectionWine
+
+# membership model -> (collection model, collection foreign key attname)
+MEMBERSHIPS = {
+    ClientCollectionWine: (ClientCollection, 'client_collection_id'),
+    ProviderCollectionWine: (ProviderCollection, 'provider_collection_id'),
+}
+
+
+@receiver(pre_save, sender=ClientCollectionWine)
+@receiver(pre_save, sender=ProviderCollectionWine)
+def remember_collection(sender, instance, **kwargs):
+    """Keep the stored collection so a membership moved to another collection moves the counts."""
+    collection_model, attname = MEMBERSHIPS[sender]
+    instance._collection_before = None
+    if not instance._state.adding and instance.pk:
+        instance._collection_before = sender.objects.filter(pk=instance.pk).values_list(attname, flat=True).first()
+
+
+@receiver(post_save, sender=ClientCollectionWine)
+@receiver(post_save, sender=ProviderCollectionWine)
+def count_added_wine(sender, instance, created, **kwargs):
+    collection_model, attname = MEMBERSHIPS[sender]
+    collection_id = getattr(instance, attname)
+    before = getattr(instance, '_collection_before', None)
+    if created:
+        change_wines_count(collection_model, collection_id, 1)
+    elif before is not None and before != collection_id:
+        change_wines_count(collection_model, before, -1)
+        change_wines_count(collection_model, collection_id, 1)
+    else:
+        change_wines_count(collection_model, collection_id, 0)
+
+
+@receiver(post_delete, sender=ClientCollectionWine)
+@receiver(post_delete, sender=ProviderCollectionWine)
+def count_removed_wine(sender, instance, **kwargs):
+    if in_batch():
+        return
+    collection_model, attname = MEMBERSHIPS[sender]
+    change_wines_count(collection_model, getattr(instance, attname), -1)
+
+
+@receiver([post_save, post_delete], sender=ClientCollectionWine)
+@receiver([post_save, post_delete], sender=ProviderCollectionWine)
+def invalidate_provider_dashboard(sender, instance, **kwargs):
+    if not in_batch():
+        invalidate_wine_dashboard(instance)
@@ -1,3 +1,245 @@
+import io
+from decimal import Decimal
+
+from django.core.management import call_command, CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from locations.models import Country, City
+from users.models import User
+from wines.models import Wine, Attribute
+from .models import ClientCollection, ClientCollectionWine, ProviderCollection, ProviderCollectionWine
+
+
+class CollectionTestMixin:
+    """Shared fixtures for the collection tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name='Chile')
+        cls.city = City.objects.create(name='Santiago', country_id=country.id)
+        cls.provider = User.objects.create_user(username='provider', password='secret', role='provider')
+        cls.client_user = User.objects.create_user(username='client', password='secret', role='client')
+        cls.wines = [
+            Wine.objects.create(
+                name=f'Wine {i}', harvest_year=2010, maker='Maker', variety='Merlot', city=cls.city,
+                provider=cls.provider, attribute=Attribute.objects.create(
+                    total_sulfur_dioxide=34, fixed_acidity=Decimal('7.40'), volatile_acidity=Decimal('0.70'),
+                    free_sulfur_dioxide=11, citric_acid=Decimal('0.000'), residual_sugar=Decimal('1.90'),
+                    chlorides=Decimal('0.0760'), density=Decimal('0.99780'), pH=Decimal('3.51'),
+                    sulphates=Decimal('0.56'), alcohol=Decimal('9.40'),
+                ),
+            )
+            for i in range(3)
+        ]
+
+
+class WinesCountTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.collections = [
+            ClientCollection.objects.create(collection_name=f'Mine {i}', description='', client=self.client_user)
+            for i in range(2)
+        ]
+
+    def test_counts_follow_membership_changes(self):
+        first, second = self.collections
+        entries = [ClientCollectionWine.objects.create(client_collection=first, wine=wine) for wine in self.wines]
+        entries[0].client_collection = second
+        entries[0].save()
+        entries[1].delete()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.wines_count, second.wines_count), (1, 1))
+
+    def test_list_runs_no_per_row_queries(self):
+        for collection in self.collections:
+            for wine in self.wines:
+                ClientCollectionWine.objects.create(client_collection=collection, wine=wine)
+        self.api.force_authenticate(self.client_user)
+        with self.assertNumQueries(2):  # the ETag aggregate and the page
+            response = self.api.get(reverse('client-collection-list'))
+        self.assertEqual([row['wines_count'] for row in response.data], [3, 3])
+
+    def test_reconcile_command(self):
+        collection = ProviderCollection.objects.create(collection_name='Reds', description='', provider=self.provider)
+        ProviderCollectionWine.objects.create(provider_collection=collection, wine=self.wines[0])
+        ProviderCollection.objects.filter(pk=collection.pk).update(wines_count=5)  # drift
+        with self.assertRaises(CommandError):
+            call_command('reconcile_collection_counts', '--check', stdout=io.StringIO())
+        call_command('reconcile_collection_counts', stdout=io.StringIO())
+        call_command('reconcile_collection_counts', '--check', stdout=io.StringIO())
+        collection.refresh_from_db()
+        self.assertEqual(collection.wines_count, 1)
+
+
+class BulkCollectionWinesTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.collection = ClientCollection.objects.create(collection_name='Mine', description='', client=self.client_user)
+        self.ids = [wine.id for wine in self.wines]
+
+    def post(self, operation, wine_ids, collection=None):
+        url = reverse(f'client-collection-{operation}-wines', args=[(collection or self.collection).pk])
+        return self.api.post(url, {'wine_ids': wine_ids}, format='json')
+
+    def members(self):
+        self.collection.refresh_from_db()
+        members = set(self.collection.clientcollectionwine_set.values_list('wine_id', flat=True))
+        self.assertEqual(self.collection.wines_count, len(members))
+        return members
+
+    def test_set_semantics(self):
+        response = self.post('add', self.ids[:2] + [9999])
+        self.assertEqual(response.data, {'added': self.ids[:2], 'removed': [], 'unknown': [9999]})
+        self.assertEqual(self.post('add', self.ids[:2]).data['added'], [])
+        self.assertEqual(self.members(), set(self.ids[:2]))
+
+        response = self.post('replace', self.ids[1:])
+        self.assertEqual((response.data['added'], response.data['removed']), (self.ids[2:], self.ids[:1]))
+        self.assertEqual(self.members(), set(self.ids[1:]))
+
+        self.assertEqual(self.post('remove', self.ids).data['removed'], self.ids[1:])
+        self.assertEqual(self.members(), set())
+
+    def test_rejects_non_integer_ids(self):
+        for wine_ids in ([True], ['1'], 1):
+            self.assertEqual(self.post('add', wine_ids).status_code, 400)
+        self.assertEqual(self.members(), set())
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        with self.assertNumQueries(9):
+            self.post('add', self.ids[:1])
+        self.post('remove', self.ids[:1])
+        with self.assertNumQueries(9):
+            self.post('add', self.ids)
+        with self.assertNumQueries(9):  # the delete loads the rows for their signals instead of existing_wines
+            self.post('remove', self.ids)
+
+    def test_counts_come_from_the_rows(self):
+        ClientCollection.objects.filter(pk=self.collection.pk).update(wines_count=7)  # drift, e.g. a racing add
+        self.post('add', self.ids[:2])
+        self.assertEqual(self.members(), set(self.ids[:2]))
+        self.post('replace', self.ids[2:])
+        self.assertEqual(self.members(), set(self.ids[2:]))
+
+    def test_only_the_owner_can_change_the_collection(self):
+        other = User.objects.create_user(username='other', password='secret', role='client')
+        collection = ClientCollection.objects.create(collection_name='Theirs', description='', client=other)
+        self.assertEqual(self.post('add', self.ids, collection).status_code, 404)  # outside the scoped queryset
+
+    def test_provider_collections(self):
+        self.api.force_authenticate(self.provider)
+        collection = ProviderCollection.objects.create(collection_name='Reds', description='', provider=self.provider)
+        url = reverse('provider-collection-add-wines', args=[collection.pk])
+        self.assertEqual(self.api.post(url, {'wine_ids': self.ids}, format='json').data['added'], self.ids)
+        collection.refresh_from_db()
+        self.assertEqual(collection.wines_count, 3)
+
+
+class CollectionContentsTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.collection = ClientCollection.objects.create(collection_name='Mine', description='', client=self.client_user)
+        self.url = reverse('client-collection-wines', args=[self.collection.pk])
+
+    def test_fixed_queries_and_cursor_pages(self):
+        for wine in self.wines:
+            ClientCollectionWine.objects.create(client_collection=self.collection, wine=wine)
+        with self.assertNumQueries(2):
+            response = self.api.get(self.url, {'page_size': 2})
+        self.assertEqual([row['wine']['id'] for row in response.data['results']], [self.wines[2].id, self.wines[1].id])
+        self.assertEqual(response.data['results'][0]['client_collection'], 'Mine')
+        self.assertEqual(response.data['results'][0]['wine']['attribute']['pH'], '3.51')
+        response = self.api.get(response.data['next'])
+        self.assertEqual([row['wine']['id'] for row in response.data['results']], [self.wines[0].id])
+
+    def test_same_day_additions_page_on_the_full_keyset(self):
+        for wine in self.wines:
+            ClientCollectionWine.objects.create(client_collection=self.collection, wine=wine)
+        seen, url = [], self.url + '?page_size=1'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.api.get(url)
+                seen += [row['wine']['id'] for row in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(seen, [wine.id for wine in reversed(self.wines)])
+        self.assertFalse([query for query in queries.captured_queries if 'OFFSET' in query['sql'].upper()])
+        self.assertTrue([query for query in queries.captured_queries if '"added_date" <' in query['sql']])
+
+
+class OwnershipScopingTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.other = User.objects.create_user(username='other', password='secret', role='client')
+        self.mine = ClientCollection.objects.create(collection_name='Mine', description='', client=self.client_user)
+        self.theirs = ClientCollection.objects.create(collection_name='Theirs', description='', client=self.other)
+        ClientCollectionWine.objects.create(client_collection=self.mine, wine=self.wines[0])
+        self.their_entry = ClientCollectionWine.objects.create(client_collection=self.theirs, wine=self.wines[1])
+
+    def test_mine_mode_and_scoped_changes(self):
+        url = reverse('client-collection-list')
+        self.assertEqual(len(self.api.get(url).data), 2)
+        self.assertEqual([row['id'] for row in self.api.get(url, {'mine': 'true'}).data], [self.mine.id])
+        detail = reverse('client-collection-detail', args=[self.theirs.id])
+        self.assertEqual(self.api.get(detail).status_code, 200)
+        self.assertEqual(self.api.patch(detail, {'description': 'x'}, format='json').status_code, 404)
+
+    def test_staff_act_on_any_collection(self):
+        self.client_user.is_staff = True
+        self.client_user.save()
+        detail = reverse('client-collection-detail', args=[self.theirs.id])
+        self.assertEqual(self.api.patch(detail, {'description': 'x'}, format='json').status_code, 200)
+        entry = reverse('client-collection-wine-detail', args=[self.their_entry.id])
+        self.assertEqual(self.api.get(entry).status_code, 200)
+        self.assertEqual([row['id'] for row in self.api.get(reverse('client-collection-list'), {'mine': 'true'}).data], [self.mine.id])
+
+    def test_membership_rows_are_scoped_to_the_owner(self):
+        response = self.api.get(reverse('client-collection-wine-list'))
+        self.assertEqual([row['wine']['id'] for row in response.data], [self.wines[0].id])
+        detail = reverse('client-collection-wine-detail', args=[self.their_entry.id])
+        self.assertEqual(self.api.delete(detail).status_code, 404)
+        response = self.api.post(
+            reverse('client-collection-wine-list'),
+            {'wine_id': self.wines[2].id, 'client_collection_id': self.theirs.id}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_owner_checks_run_no_extra_queries(self):
+        detail = reverse('client-collection-wine-detail', args=[ClientCollectionWine.objects.get(client_collection=self.mine).id])
+        with self.assertNumQueries(3):  # the row with its relations, the delete and the wines_count update
+            self.assertEqual(self.api.delete(detail).status_code, 204)
+
+
+class CollectionNameUniquenessTests(CollectionTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.url = reverse('client-collection-list')
 
-# Create your tests here.
+    def test_duplicate_names_are_rejected_case_insensitively(self):
+        response = self.api.post(self.url, {'collection_name': 'Reds', 'description': 'Reds'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        detail = reverse('client-collection-detail', args=[response.data['id']])
+        with self.assertNumQueries(4):  # no pre-check: only the insert inside its savepoint
+            response = self.api.post(self.url, {'collection_name': 'REDS', 'description': 'Reds'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['collection_name'], ['Collection name already exists.'])
+        response = self.api.patch(detail, {'collection_name': 'Reds', 'description': 'Same name'}, format='json')
+        self.assertEqual(response.status_code, 200)
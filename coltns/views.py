@@ -1,6 +1,13 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
+from wine_collection_api.conditional import ConditionalGetMixin
+
+from .membership import CollectionWines
+from .pagination import CollectionWinesPagination
 from .models import (
     ProviderCollection,
     ClientCollection,
@@ -27,25 +34,100 @@ from .permissions import (
     CanViewProviderCollection,
 )
 
+BULK_WINE_ACTIONS = ['add_wines', 'remove_wines', 'replace_wines']
+OWNER_ACTIONS = ['update', 'partial_update', 'destroy', *BULK_WINE_ACTIONS]
+
+
+def wants_mine(request):
+    """?mine=true limits a list to the caller's own collections."""
+    return request.query_params.get('mine') in ('1', 'true')
+
+
+def is_admin(user):
+    """Staff and superusers act on any collection, as in the owner permissions."""
+    return user.is_staff or user.is_superuser
+
+
+class CollectionWinesMixin:
+    """
+    Bulk add-wines/, remove-wines/ and replace-wines/ actions on a collection, taking
+    {"wine_ids": [...]} and returning the ids that changed. Unknown wine ids are reported, not stored.
+    """
+    bulk_wines_limit = 1000
+    contents_serializer_class = None
+
+    def get_wine_ids(self, request):
+        wine_ids = request.data.get('wine_ids') if isinstance(request.data, dict) else None
+        if not isinstance(wine_ids, list) or not all(
+            isinstance(wine_id, int) and not isinstance(wine_id, bool) for wine_id in wine_ids
+        ):
+            raise ValidationError({'wine_ids': 'Expected a list of wine ids.'})
+        if len(wine_ids) > self.bulk_wines_limit:
+            raise ValidationError({'wine_ids': f'At most {self.bulk_wines_limit} wines per request.'})
+        return set(wine_ids)
+
+    def apply_wines(self, request, operation):
+        collection = self.get_object()
+        wine_ids = self.get_wine_ids(request)
+        existing = CollectionWines.existing_wines(wine_ids) if operation != 'remove' else wine_ids
+        result = getattr(CollectionWines(collection), operation)(existing)
+        added, removed = {'add': (result, []), 'remove': ([], result), 'replace': result}[operation]
+        return Response({'added': added, 'removed': removed, 'unknown': sorted(wine_ids - existing)})
+
+    @action(detail=True, methods=['get'])
+    def wines(self, request, pk=None):
+        """
+        Wines in the collection, newest additions first, cursor-paginated.
+        Two queries per page: the collection and the page with every wine relation joined.
+        """
+        collection = self.get_object()
+        contents = CollectionWines(collection)
+        queryset = contents.members().select_related('wine__attribute', 'wine__city', 'wine__provider')
+        paginator = CollectionWinesPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        for member in page:
+            setattr(member, contents.field, collection)  # already loaded, serialized as its name
+        serializer = self.contents_serializer_class(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'], url_path='add-wines')
+    def add_wines(self, request, pk=None):
+        return self.apply_wines(request, 'add')
+
+    @action(detail=True, methods=['post'], url_path='remove-wines')
+    def remove_wines(self, request, pk=None):
+        return self.apply_wines(request, 'remove')
+
+    @action(detail=True, methods=['post'], url_path='replace-wines')
+    def replace_wines(self, request, pk=None):
+        return self.apply_wines(request, 'replace')
+
+
 # Provider collections
-class ProviderCollectionViewSet(viewsets.ModelViewSet):
+class ProviderCollectionViewSet(CollectionWinesMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ProviderCollectionReadSerializer
+    contents_serializer_class = ProviderCollectionWineSerializer
+    last_modified_fields = ['updated_at', 'type__updated_at', 'provider__updated_at']
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return ProviderCollection.objects.none()
 
+        queryset = ProviderCollection.objects.select_related('provider', 'type')
         if user.role == 'client':
-            return ProviderCollection.objects.all()
+            return queryset
 
         if user.role == 'provider':
-            return ProviderCollection.objects.select_related('provider').filter(provider=user)
+            if self.action in OWNER_ACTIONS and is_admin(user):
+                return queryset
+            return queryset.filter(provider_id=user.id)
+        return ProviderCollection.objects.none()
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "wines"]:
             return [CanViewProviderCollection()]  # clients can see all collections, providers can view all but only modify their own
-        elif self.action in ["retrieve", "update", "partial_update", "destroy"]:
+        elif self.action in ["retrieve", "update", "partial_update", "destroy", *BULK_WINE_ACTIONS]:
             return [IsProvider(), IsProviderCollectionOwner()]# only providers can modify their own
         return [IsAuthenticated()]
 
@@ -58,17 +140,25 @@ class ProviderCollectionViewSet(viewsets.ModelViewSet):
         serializer.save(provider=self.request.user)
 
 # Client collections
-class ClientCollectionViewSet(viewsets.ModelViewSet):
+class ClientCollectionViewSet(CollectionWinesMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ClientCollectionReadSerializer
+    contents_serializer_class = ClientCollectionWineSerializer
+    last_modified_fields = ['updated_at', 'client__updated_at']
 
     def get_queryset(self):
-        return ClientCollection.objects.all()
+        """Every collection can be browsed; changes and ?mine=true are scoped to the caller's in SQL."""
+        queryset = ClientCollection.objects.select_related('client')
+        if self.action in OWNER_ACTIONS and not is_admin(self.request.user) or (
+            self.action == 'list' and wants_mine(self.request)
+        ):
+            queryset = queryset.filter(client_id=self.request.user.id)
+        return queryset
 
     def get_permissions(self):
-        if self.action in ["list","retrieve"]:
+        if self.action in ["list", "retrieve", "wines"]:
             return [IsClient()]
         
-        elif self.action in ["update", "partial_update", "destroy"]:
+        elif self.action in ["update", "partial_update", "destroy", *BULK_WINE_ACTIONS]:
             return [IsClient(), IsClientCollectionOwner()]
         return [IsClient()]
 
@@ -82,19 +172,26 @@ class ClientCollectionViewSet(viewsets.ModelViewSet):
 
 
 # Client collection wines
-class ClientCollectionWineViewSet(viewsets.ModelViewSet):
+class ClientCollectionWineViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ClientCollectionWineSerializer
+    last_modified_fields = [
+        'updated_at', 'client_collection__updated_at', 'wine__updated_at',
+        'wine__attribute__updated_at', 'wine__city__updated_at', 'wine__provider__updated_at',
+    ]
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return ClientCollectionWine.objects.none()
 
+        queryset = ClientCollectionWine.objects.select_related(
+            'client_collection', 'wine__attribute', 'wine__city', 'wine__provider'
+        )
+        if is_admin(user):
+            return queryset
         if user.role == 'client':
-            return ClientCollectionWine.objects.all()
-
-        if user.role == 'provider':
-            return ClientCollectionWine.objects.none()
+            return queryset.filter(client_collection__client_id=user.id)
+        return ClientCollectionWine.objects.none()
 
     def get_permissions(self):
         if self.action in ["list","retrieve"]:
@@ -106,19 +203,30 @@ class ClientCollectionWineViewSet(viewsets.ModelViewSet):
 
 
 # Provider collection wines
-class ProviderCollectionWineViewSet(viewsets.ModelViewSet):
+class ProviderCollectionWineViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ProviderCollectionWineSerializer
+    last_modified_fields = [
+        'updated_at', 'provider_collection__updated_at', 'wine__updated_at',
+        'wine__attribute__updated_at', 'wine__city__updated_at', 'wine__provider__updated_at',
+    ]
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return ProviderCollectionWine.objects.none()
 
+        queryset = ProviderCollectionWine.objects.select_related(
+            'provider_collection', 'wine__attribute', 'wine__city', 'wine__provider'
+        )
+
         if user.role == 'client':
-            return ProviderCollectionWine.objects.all()
+            return queryset
 
         if user.role == 'provider':
-            return ProviderCollectionWine.objects.filter(provider_collection__provider=user)
+            if self.action in OWNER_ACTIONS and is_admin(user):
+                return queryset
+            return queryset.filter(provider_collection__provider_id=user.id)
+        return ProviderCollectionWine.objects.none()
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
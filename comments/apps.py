@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CommentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comments'
+
+    def ready(self):
+        from . import signals  # connects the model signal handlers
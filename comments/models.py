@@ -19,6 +19,7 @@ class WineComment(models.Model): # For clients comments any wine
 
     comment = models.TextField(max_length=250)
     comment_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the comment was last modified
 
 class ClientCollectionCommment(models.Model): # For clients comments Other client collections
     """Model to store comments for collections."""
@@ -32,4 +33,5 @@ class ClientCollectionCommment(models.Model): # For clients comments Other clien
     )
 
     comment = models.TextField(max_length=250)
-    comment_date = models.DateTimeField(auto_now_add=True)    
\ No newline at end of file
+    comment_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the comment was last modified
\ No newline at end of file
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from wines.dashboard import invalidate_wine_dashboard
+from .models import WineComment
+
+
+@receiver([post_save, post_delete], sender=WineComment)
+def invalidate_provider_dashboard(sender, instance, **kwargs):
+    invalidate_wine_dashboard(instance)
@@ -4,6 +4,8 @@ from .permissions import CanViewComment
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 
+from wine_collection_api.conditional import ConditionalGetMixin
+
 
 from .models import WineComment, ClientCollectionCommment
 from .serializer import (WineCommentReadSerializer,WineCommentWriteSerializer,
@@ -12,9 +14,10 @@ ClientCollectionReadCommmentSerializer,ClientCollectionWriteCommmentSerializer
 
 # Wine comments
 
-class WineCommentViewSet(viewsets.ModelViewSet):
+class WineCommentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     
     permission_classes = [IsAuthenticated]
+    last_modified_fields = ['updated_at', 'client__updated_at', 'wine__updated_at']
     
     def get_queryset(self):
         user = self.request.user
@@ -50,12 +53,13 @@ class WineCommentViewSet(viewsets.ModelViewSet):
             return WineCommentWriteSerializer
         return WineCommentReadSerializer
     def perform_create(self,serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(client=self.request.user)
             
     
-class ClientCollectionCommmentViewSet(viewsets.ModelViewSet):
-    queryset = ClientCollectionCommment.objects.all()
+class ClientCollectionCommmentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = ClientCollectionCommment.objects.select_related('client', 'clientcollection')
     permission_classes = [IsAuthenticated]
+    last_modified_fields = ['updated_at', 'client__updated_at', 'clientcollection__updated_at']
     
     def get_permissions(self):
         """
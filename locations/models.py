@@ -5,6 +5,7 @@ from django.db import models
 class Country(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the country was last modified
     
     def __str__(self):
         return f"{self.id} - {self.name}" # Return the country id and name as the string representation of the Country model
@@ -13,7 +14,8 @@ class Country(models.Model):
 class City(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
-    country_id = models.IntegerField()
+    country_id = models.IntegerField(db_index=True) # Index for filtering wines by country
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the city was last modified
     
     def __str__(self):
         return f"{self.id} - {self.name}" # Return the city id and name as the string representation of the City model
\ No newline at end of file
@@ -24,6 +24,7 @@ class User(AbstractUser):
     )
 
     registration_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Date when the user was last modified
 
     class Meta:
         db_table = 'users_user'
@@ -4,13 +4,15 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.decorators import action
 
+from wine_collection_api.conditional import ConditionalGetMixin
+
 from .models import User
 from .permissions import IsClient, IsProvider, IsOwner, CanViewUserProfile
 from .serializer import (ClientLoginSerializer, CustomClientDetailSerializer,
                          CustomProviderDetailSerializer,ProviderLoginSerializer,ClientRegisterSerializer,
                          ProviderRegisterSerializer)
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Client view set."""
     serializer_class = CustomClientDetailSerializer
     
@@ -48,9 +50,10 @@ class ClientViewSet(viewsets.ModelViewSet):
         serializer.save()
         return Response(serializer.data)
         
-class ProviderViewSet(viewsets.ModelViewSet):
+class ProviderViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Provider view set."""
     serializer_class = CustomProviderDetailSerializer
+    last_modified_fields = ['updated_at', 'city__updated_at']
     
     def get_queryset(self):
         """
@@ -58,7 +61,7 @@ class ProviderViewSet(viewsets.ModelViewSet):
         
         :param self: Description
         """
-        return User.objects.filter(role='provider')
+        return User.objects.filter(role='provider').select_related('city')
 
     
     def get_permissions(self):
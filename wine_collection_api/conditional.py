@@ -0,0 +1,106 @@
+"""
+Conditional GET support (ETag / Last-Modified) shared by the API viewsets.
+"""
+import hashlib
+from datetime import datetime
+from functools import reduce
+
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """Strong ETag from any repr-able parts."""
+    return '"%s"' % hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """
+    Evaluate If-None-Match, then If-Modified-Since when no ETag was sent (RFC 9110 precedence).
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if if_modified_since is not None and last_modified is not None:
+        return int(last_modified.timestamp()) <= if_modified_since
+    return False
+
+
+def validator_headers(etag, last_modified=None):
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return headers
+
+
+def latest(values):
+    """Most recent of several optional datetimes."""
+    values = [value for value in values if isinstance(value, datetime)]
+    return reduce(max, values) if values else None
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified to list and retrieve responses.
+
+    Lists are validated with one aggregate query (COUNT plus MAX over
+    `last_modified_fields`), so a matching conditional GET returns 304 without
+    serializing anything. They carry only an ETag: a delete leaves MAX(updated_at)
+    where it was, so If-Modified-Since could not see it, while the count in the ETag
+    does. Details use the fetched object's timestamps, after the usual object
+    permission checks, and send both validators.
+    """
+    last_modified_fields = ['updated_at']
+
+    def get_list_validators(self, request, queryset):
+        aggregates = {f'max_{i}': Max(field) for i, field in enumerate(self.last_modified_fields)}
+        values = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+        last_modified = latest(values[f'max_{i}'] for i in range(len(self.last_modified_fields)))
+        etag = make_etag(
+            request.user.pk, request.path, sorted(request.query_params.lists()),
+            request.accepted_renderer.format, values['count'], last_modified,
+        )
+        return etag, last_modified
+
+    def get_object_last_modified(self, instance):
+        """
+        Latest of the object's timestamps. Every relation in `last_modified_fields` is
+        part of the response, so get_queryset() should select_related them; any that
+        was not loaded is fetched here rather than left out of the validators.
+        """
+        values = []
+        for field in self.last_modified_fields:
+            *relations, attr = field.split('__')
+            value = instance
+            for relation in relations:
+                if value is None:
+                    break
+                value = getattr(value, relation)
+            values.append(getattr(value, attr, None) if value is not None else None)
+        return latest(values)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, _ = self.get_list_validators(request, queryset)
+        if is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag))
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = self.get_object_last_modified(instance)
+        etag = make_etag(
+            request.user.pk, request.path, sorted(request.query_params.lists()),
+            request.accepted_renderer.format, instance.pk, last_modified,
+        )
+        if is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified))
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers=validator_headers(etag, last_modified))
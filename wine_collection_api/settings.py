@@ -46,7 +46,8 @@ INSTALLED_APPS = [
     'locations',
     'users',
     'wines',
-    'coltns'
+    'coltns',
+    'comments',
     
 ]
 
@@ -57,7 +58,6 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -162,6 +162,10 @@ AUTHENTICATION_BACKENDS = (
 # Auth user model
 AUTH_USER_MODEL = 'users.User'
 
+# Collection names are unique case-insensitively across all collections ('global') or per owner ('owner').
+# Changing the scope changes the database constraint and needs a migration.
+COLLECTION_NAME_UNIQUE_SCOPE = 'global'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
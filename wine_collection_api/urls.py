@@ -45,4 +45,5 @@ urlpatterns = [
     path('locations/',include('locations.urls')),
     path('wines/',include('wines.urls')),
     path('users/',include('users.urls')),
+    path('comments/',include('comments.urls')),
 ]
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class WinesConfig(AppConfig):
     name = 'wines'
+
+    def ready(self):
+        from . import signals  # connects the model signal handlers
+        post_migrate.connect(signals.create_search_index_after_migrate, sender=self)
@@ -0,0 +1,145 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+
+from wine_collection_api.conditional import is_not_modified, latest, make_etag, validator_headers
+from .models import Wine
+
+CATALOG_VERSION_KEY = 'wines:catalog-version'
+
+
+def get_catalog_version():
+    """
+    Current catalog version. Starts from a timestamp so a version lost to cache
+    eviction never comes back with a value that older entries were stored under.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached wine listing."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:  # not set yet
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class CatalogCacheMixin:
+    """
+    Caches list responses per query string and catalog version, with a strong ETag.
+    A matching If-None-Match gets a 304 before the queryset is touched.
+    """
+    cache_timeout = 600
+
+    def get_list_cache_key(self, request):
+        parts = [
+            request.path,
+            sorted(request.query_params.lists()),
+            request.accepted_renderer.format,
+            get_catalog_version(),
+        ]
+        return 'wines:list:' + hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        etag = f'"{key.rsplit(":", 1)[1][:32]}"'
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, self.cache_timeout)
+        return Response(data, headers={'ETag': etag})
+
+
+WINE_DETAIL_KEY = 'wines:detail-payload:{}'
+DETAIL_STATS_KEYS = {'hits': 'wines:detail-stats:hits', 'misses': 'wines:detail-stats:misses'}
+
+
+def invalidate_wine_details(wine_ids):
+    """Drop the cached payloads of `wine_ids`."""
+    cache.delete_many([WINE_DETAIL_KEY.format(wine_id) for wine_id in wine_ids])
+
+
+def record_detail_stat(stat):
+    key = DETAIL_STATS_KEYS[stat]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add and incr
+            cache.add(key, 1, timeout=None)
+
+
+def get_detail_stats():
+    """Hit and miss counters of the per-wine payload cache."""
+    return {stat: cache.get(key, 0) for stat, key in DETAIL_STATS_KEYS.items()}
+
+
+class WineDetailCacheMixin:
+    """
+    Read-through cache of the full serialized payload of each wine, keyed by id.
+    Entries are dropped by the signals when the wine, its attribute, its city or
+    its provider change; ?fields= and ?expand= are applied to the cached payload.
+    The entry also keeps the latest of those timestamps for ETag/Last-Modified.
+
+    A miss goes through get_object(), so the viewset's queryset, filters and object
+    permissions apply. A hit cannot re-run the queryset: it re-checks the object
+    permissions against a stub of the wine's ids kept in the entry, so any per-user
+    access rule must be expressed as an object permission, not as queryset scoping.
+
+    Filling the entry is read-then-set: a write committed between the database read
+    and cache.set() invalidates before the stale payload is stored, which then lives
+    until `detail_cache_timeout`. Keep the timeout short enough for that window.
+    """
+    detail_cache_timeout = 3600
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not str(pk).isdigit():
+            raise Http404
+        key = WINE_DETAIL_KEY.format(int(pk))
+
+        serializer_class = self.get_serializer_class()
+        entry = cache.get(key)
+        if entry is None:
+            record_detail_stat('misses')
+            instance = self.get_object()
+            entry = {
+                'data': dict(serializer_class(instance).data),  # no request context: every field
+                'object': Wine(  # ids only, for the object permissions on later hits
+                    id=instance.id, provider_id=instance.provider_id,
+                    city_id=instance.city_id, attribute_id=instance.attribute_id,
+                ),
+                'last_modified': latest([
+                    instance.updated_at,
+                    instance.attribute.updated_at,
+                    instance.city.updated_at,
+                    instance.provider.updated_at if instance.provider else None,
+                ]),
+            }
+            cache.set(key, entry, self.detail_cache_timeout)
+        else:
+            record_detail_stat('hits')
+            self.check_object_permissions(request, entry['object'])
+
+        selected = serializer_class.get_selected_fields(request)
+        numbers = serializer_class.wants_numbers(request)
+        last_modified = entry['last_modified']
+        etag = make_etag(int(pk), last_modified, sorted(selected), numbers, request.accepted_renderer.format)
+        headers = validator_headers(etag, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        data = {field: value for field, value in entry['data'].items() if field in selected}
+        if numbers and data.get('attribute'):
+            data['attribute'] = serializer_class.numeric_attribute(data['attribute'])
+        return Response(data, headers=headers)
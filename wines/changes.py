@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Wine, WineChange
+
+# How long a missing outbox id may still belong to an uncommitted transaction
+GAP_GRACE = timedelta(seconds=30)
+
+
+def record_changes(wine_ids, action):
+    """Append one outbox row per wine; runs in the caller's transaction."""
+    WineChange.objects.bulk_create([WineChange(wine_id=wine_id, action=action) for wine_id in wine_ids])
+
+
+def changes_since(cursor, limit):
+    """
+    Outbox rows after `cursor`, oldest first, collapsed to the latest row per wine.
+    Returns (changes, next_cursor, has_more).
+
+    Ids are allocated at insert but become visible at commit, so on PostgreSQL and
+    MySQL a long transaction can commit a row below ids a reader has already passed.
+    The page stops before the first gap in the ids until the row after it is older
+    than GAP_GRACE; gaps that outlive it are rollbacks and are skipped.
+    """
+    rows = list(WineChange.objects.filter(id__gt=cursor).order_by('id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    settled = timezone.now() - GAP_GRACE
+    for index, row in enumerate(rows):
+        previous = rows[index - 1].id if index else cursor
+        if row.id != previous + 1 and row.changed_at > settled:
+            rows, has_more = rows[:index], False  # poll again later rather than skip the gap
+            break
+    latest = {row.wine_id: row for row in rows}
+    changes = sorted(latest.values(), key=lambda row: row.id)
+    next_cursor = rows[-1].id if rows else cursor
+    return changes, next_cursor, has_more
+
+
+def live_wines(changes, queryset=None):
+    """Current rows of the wines that were not deleted, keyed by id."""
+    queryset = Wine.objects.with_related() if queryset is None else queryset
+    wine_ids = [change.wine_id for change in changes if change.action != WineChange.DELETED]
+    return queryset.in_bulk(wine_ids) if wine_ids else {}
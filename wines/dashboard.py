@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from coltns.models import ClientCollectionWine, ProviderCollectionWine
+from comments.models import WineComment
+from .models import Wine
+
+DASHBOARD_KEY = 'wines:provider-dashboard:{}'
+DASHBOARD_TIMEOUT = 3600
+
+
+def provider_dashboard(provider_id):
+    """
+    Summary of one provider's catalog in four aggregate queries: wines per variety
+    and harvest year, collections holding the wines, and comments on them.
+    """
+    groups = list(
+        Wine.objects.filter(provider_id=provider_id).order_by('variety', '-harvest_year')
+        .values('variety', 'harvest_year').annotate(count=Count('id'))
+    )
+    by_variety, by_year = {}, {}
+    for group in groups:
+        by_variety[group['variety']] = by_variety.get(group['variety'], 0) + group['count']
+        by_year[group['harvest_year']] = by_year.get(group['harvest_year'], 0) + group['count']
+
+    provider_collections = ProviderCollectionWine.objects.filter(wine__provider_id=provider_id).aggregate(
+        collections=Count('provider_collection', distinct=True), wines=Count('wine', distinct=True),
+    )
+    client_collections = ClientCollectionWine.objects.filter(wine__provider_id=provider_id).aggregate(
+        collections=Count('client_collection', distinct=True), wines=Count('wine', distinct=True),
+    )
+    comments = WineComment.objects.filter(wine__provider_id=provider_id).aggregate(
+        total=Count('id'), wines=Count('wine', distinct=True), clients=Count('client', distinct=True),
+    )
+    return {
+        'wines': {
+            'total': sum(by_variety.values()),
+            'by_variety': [{'variety': key, 'count': count} for key, count in sorted(by_variety.items())],
+            'by_harvest_year': [{'harvest_year': key, 'count': count} for key, count in sorted(by_year.items(), reverse=True)],
+            'by_variety_and_year': groups,
+        },
+        'provider_collections': provider_collections,
+        'client_collections': client_collections,
+        'comments': comments,
+    }
+
+
+def get_provider_dashboard(provider_id, timeout=DASHBOARD_TIMEOUT):
+    key = DASHBOARD_KEY.format(provider_id)
+    data = cache.get(key)
+    if data is None:
+        data = provider_dashboard(provider_id)
+        cache.set(key, data, timeout)
+    return data
+
+
+def invalidate_provider_dashboards(provider_ids):
+    """Drop the cached dashboards of `provider_ids` once the current transaction commits."""
+    keys = [DASHBOARD_KEY.format(provider_id) for provider_id in set(provider_ids) if provider_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_wine_dashboard(instance):
+    """Drop the dashboard of the provider of `instance.wine`, reading the wine only if it is not loaded."""
+    if type(instance).wine.is_cached(instance):
+        invalidate_provider_dashboards([instance.wine.provider_id])
+    else:
+        invalidate_provider_dashboards(Wine.objects.filter(pk=instance.wine_id).values_list('provider_id', flat=True))
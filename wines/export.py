@@ -0,0 +1,56 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Output column -> ORM lookup for a flat export row
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'harvest_year': 'harvest_year',
+    'maker': 'maker',
+    'variety': 'variety',
+    'city': 'city__name',
+    'country_id': 'city__country_id',
+    'provider': 'provider__username',
+    'added_date': 'added_date',
+    'total_sulfur_dioxide': 'attribute__total_sulfur_dioxide',
+    'fixed_acidity': 'attribute__fixed_acidity',
+    'volatile_acidity': 'attribute__volatile_acidity',
+    'free_sulfur_dioxide': 'attribute__free_sulfur_dioxide',
+    'citric_acid': 'attribute__citric_acid',
+    'residual_sugar': 'attribute__residual_sugar',
+    'chlorides': 'attribute__chlorides',
+    'density': 'attribute__density',
+    'pH': 'attribute__pH',
+    'sulphates': 'attribute__sulphates',
+    'alcohol': 'attribute__alcohol',
+}
+
+
+class Echo:
+    """File-like object that hands back what is written, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size):
+    """Iterate flat wine rows from the database in chunks without caching the queryset."""
+    return queryset.values_list(*EXPORT_COLUMNS.values()).iterator(chunk_size=chunk_size)
+
+
+def stream_ndjson(rows):
+    """Yield one JSON document per line."""
+    columns = list(EXPORT_COLUMNS)
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_csv(rows):
+    """Yield a CSV header followed by one line per row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(list(EXPORT_COLUMNS))
+    for row in rows:
+        yield writer.writerow(row)
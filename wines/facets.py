@@ -0,0 +1,86 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from locations.models import City
+from .models import Wine, WineFacetCount
+
+# facet name -> Wine lookup
+FACETS = {
+    'variety': 'variety',
+    'harvest_year': 'harvest_year',
+    'country': 'city__country_id',
+    'provider': 'provider_id',
+}
+
+
+def facet_counter(rows):
+    """Count (facet, value) pairs from dicts keyed by the FACETS lookups, skipping empty values."""
+    counter = Counter()
+    for row in rows:
+        for facet, lookup in FACETS.items():
+            if row[lookup] not in (None, ''):
+                counter[(facet, str(row[lookup]))] += 1
+    return counter
+
+
+def wine_facet_rows(wines):
+    """Facet lookup dicts for in-memory wines, resolving countries in one query."""
+    countries = dict(City.objects.filter(id__in={wine.city_id for wine in wines}).values_list('id', 'country_id'))
+    return [
+        {
+            'variety': wine.variety,
+            'harvest_year': wine.harvest_year,
+            'city__country_id': countries.get(wine.city_id),
+            'provider_id': wine.provider_id,
+        }
+        for wine in wines
+    ]
+
+
+def apply_deltas(counter):
+    """Add each delta to its facet count with an atomic F() update, creating missing rows first."""
+    changes = {key: delta for key, delta in counter.items() if delta}
+    if not changes:
+        return
+    WineFacetCount.objects.bulk_create(
+        [WineFacetCount(facet=facet, value=value) for facet, value in changes],
+        ignore_conflicts=True,
+    )
+    for (facet, value), delta in changes.items():
+        WineFacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+
+
+def record_wines(wines, delta=1):
+    """Count `wines` in (delta=1) or out of (delta=-1) the facet table."""
+    counter = facet_counter(wine_facet_rows(wines))
+    apply_deltas(Counter({key: count * delta for key, count in counter.items()}))
+
+
+def live_counts():
+    """Compute every facet count with GROUP BY queries against Wine."""
+    counter = Counter()
+    for facet, lookup in FACETS.items():
+        for value, count in Wine.objects.order_by().values_list(lookup).annotate(total=Count('id')):
+            if value not in (None, ''):
+                counter[(facet, str(value))] = count
+    return counter
+
+
+def stored_counts():
+    return Counter({
+        (facet, value): count
+        for facet, value, count in WineFacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'count')
+    })
+
+
+def rebuild():
+    """Replace the facet table with the live GROUP BY results."""
+    counts = live_counts()
+    with transaction.atomic():
+        WineFacetCount.objects.all().delete()
+        WineFacetCount.objects.bulk_create([
+            WineFacetCount(facet=facet, value=value, count=count) for (facet, value), count in counts.items()
+        ])
+    return counts
@@ -0,0 +1,76 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Attribute
+from .search import search
+
+RANGE_LOOKUPS = ['exact', 'gt', 'gte', 'lt', 'lte', 'range']
+
+
+def finite_decimal(raw_value):
+    value = Decimal(raw_value)
+    if not value.is_finite():
+        raise ValueError(raw_value)
+    return value
+
+
+class WineFilterBackend(BaseFilterBackend):
+    """
+    Query-param filters for wine listings.
+
+    Every Attribute measurement and harvest_year accept exact, __gt, __gte, __lt,
+    __lte and __range (two comma separated values), e.g. ?alcohol__gte=12&pH__range=3.1,3.4.
+    variety, city and country accept exact values.
+    """
+    # query param -> (ORM path, value parser, allowed lookups)
+    filter_fields = {
+        **{name: (f'attribute__{name}', finite_decimal, RANGE_LOOKUPS) for name in Attribute.MEASUREMENT_FIELDS},
+        'harvest_year': ('harvest_year', int, RANGE_LOOKUPS),
+        'variety': ('variety', str, ['exact']),
+        'city': ('city_id', int, ['exact']),
+        'country': ('city__country_id', int, ['exact']),
+    }
+
+    def get_filters(self, query_params):
+        """Translate the query params into ORM filter kwargs, rejecting malformed values."""
+        filters = {}
+        for param, raw_value in query_params.items():
+            name, _, lookup = param.partition('__')
+            if name not in self.filter_fields:
+                continue
+            lookup = lookup or 'exact'
+            path, parse, lookups = self.filter_fields[name]
+            if lookup not in lookups:
+                raise ValidationError({param: f"Unsupported lookup. Use one of: {', '.join(lookups)}."})
+            try:
+                if lookup == 'range':
+                    low, high = raw_value.split(',')
+                    value = (parse(low.strip()), parse(high.strip()))
+                else:
+                    value = parse(raw_value)
+            except (ValueError, InvalidOperation):
+                raise ValidationError({param: 'Invalid value.'})
+            filters[f'{path}__{lookup}'] = value
+        return filters
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request.query_params)
+        if filters:
+            queryset = queryset.filter(**filters)
+        return queryset
+
+
+class WineSearchFilter(BaseFilterBackend):
+    """
+    Full-text ?q= search over name, maker, variety and description.
+    Matches are annotated with search_rank so the paginator can order by relevance.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search(queryset, text)
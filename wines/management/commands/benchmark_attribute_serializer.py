@@ -0,0 +1,54 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from wines.models import Attribute
+from wines.serializer import AttributeSerializer, NumericAttributeSerializer
+
+SAMPLE = {
+    'total_sulfur_dioxide': 34,
+    'fixed_acidity': Decimal('7.40'),
+    'volatile_acidity': Decimal('0.70'),
+    'free_sulfur_dioxide': 11,
+    'citric_acid': Decimal('0.000'),
+    'residual_sugar': Decimal('1.90'),
+    'chlorides': Decimal('0.0760'),
+    'density': Decimal('0.99780'),
+    'pH': Decimal('3.51'),
+    'sulphates': Decimal('0.56'),
+    'alcohol': Decimal('9.40'),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare AttributeSerializer with the ?decimals=number fast path on in-memory attributes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Attributes per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per serializer; the best one is reported')
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        attributes = [Attribute(id=i, **SAMPLE) for i in range(1, rows + 1)]
+        renderer = JSONRenderer()
+
+        results = {}
+        for label, serializer_class in [('AttributeSerializer', AttributeSerializer),
+                                        ('NumericAttributeSerializer', NumericAttributeSerializer)]:
+            results[label] = self.best_of(
+                repeat, lambda: renderer.render(serializer_class(attributes, many=True).data)
+            )
+            self.stdout.write(f'{label}: {results[label]:.3f}s, {rows / results[label]:.0f} rows/sec')
+
+        speedup = results['AttributeSerializer'] / results['NumericAttributeSerializer']
+        self.stdout.write(self.style.SUCCESS(f'Fast path is {speedup:.1f}x faster (serialize + render, {rows} rows).'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wines.snapshot import build_snapshot, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = "Write the memory-mapped Attribute column snapshot read by the workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Snapshot directory (default: WINE_SNAPSHOT_DIR)')
+        parser.add_argument('--keep', type=int, default=2, help='Number of versions to keep')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        directory = options['dir'] or snapshot_dir()
+        version, count = build_snapshot(directory, keep=max(options['keep'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote snapshot {version} with {count} attributes to {directory} in {time.monotonic() - started:.2f}s.'
+        ))
@@ -0,0 +1,180 @@
+import csv
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from locations.models import City
+from users.models import User
+from wines.models import Wine, Attribute, WineChange
+from wines.caching import bump_catalog_version
+from wines.changes import record_changes
+from wines.dashboard import invalidate_provider_dashboards
+from wines.facets import record_wines
+from wines.search import index_wines
+from wines.similarity import attribute_index
+
+ATTRIBUTE_FIELDS = Attribute.MEASUREMENT_FIELDS
+VARIETY_MAX_LENGTH = Wine._meta.get_field('variety').max_length
+
+
+def clean_attribute(row, columns):
+    """
+    Parse the measurement cells of one row with the model fields, so integer columns
+    reject fractions and decimals are checked against max_digits/decimal_places.
+    Returns the field values, or None if any cell is invalid.
+    """
+    values = {}
+    for name, index in zip(ATTRIBUTE_FIELDS, columns):
+        try:
+            values[name] = Attribute._meta.get_field(name).clean(row[index].strip(), None)
+        except ValidationError:
+            return None
+    return values
+
+
+def clean_option(field, value, option):
+    """Check a value applied to every imported wine against the Wine field, before any row is read."""
+    try:
+        return Wine._meta.get_field(field).clean(value, None)
+    except ValidationError as error:
+        raise CommandError(f"{option}: {' '.join(error.messages)}")
+
+
+def to_float_column(values):
+    """Convert a column of strings to floats, mapping unparsable cells to NaN."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        column = np.empty(len(values))
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except ValueError:
+                column[i] = np.nan
+        return column
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a wine-quality lab CSV (fixed acidity;volatile acidity;...;alcohol) "
+        "into Attribute and Wine rows in large batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--city', type=int, required=True, help='City id for the imported wines')
+        parser.add_argument('--harvest-year', type=int, required=True, help='Harvest year for the imported wines')
+        parser.add_argument('--variety', default='Unknown',
+                            help='Variety used when the file has no "type" or "variety" column')
+        parser.add_argument('--maker', default='Unknown', help='Maker for the imported wines')
+        parser.add_argument('--provider', help='Username of the provider owning the wines')
+        parser.add_argument('--name-prefix', help='Prefix for generated wine names (defaults to the file name)')
+        parser.add_argument('--delimiter', default=';', help='CSV delimiter (default ";")')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per insert batch')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        if not City.objects.filter(id=options['city']).exists():
+            raise CommandError(f"City {options['city']} does not exist.")
+
+        provider = None
+        if options['provider']:
+            try:
+                provider = User.objects.get(username=options['provider'], role='provider')
+            except User.DoesNotExist:
+                raise CommandError(f"No provider found with username {options['provider']}.")
+
+        self.options = options
+        self.provider = provider
+        self.name_prefix = options['name_prefix'] or path.stem
+        clean_option('harvest_year', options['harvest_year'], '--harvest-year')
+        clean_option('maker', options['maker'], '--maker')
+        clean_option('variety', options['variety'], '--variety')
+        with path.open(newline='') as handle:
+            lines = sum(1 for _ in handle)  # names end with the row number
+        clean_option('name', f'{self.name_prefix} {max(lines - 1, 1)}', '--name-prefix')
+        self.lower, self.upper = map(np.array, Attribute.measurement_ranges())
+
+        imported = rejected = 0
+        started = time.perf_counter()
+        with path.open(newline='') as handle:
+            reader = csv.reader(handle, delimiter=options['delimiter'])
+            header = [column.strip().strip('"').lower().replace(' ', '_') for column in next(reader)]
+            header = ['pH' if column == 'ph' else column for column in header]
+            missing = [name for name in ATTRIBUTE_FIELDS if name not in header]
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(missing)}")
+            self.columns = [header.index(name) for name in ATTRIBUTE_FIELDS]
+            self.variety_column = next(
+                (header.index(name) for name in ('variety', 'type') if name in header), None
+            )
+
+            row_number = 0
+            while True:
+                batch = list(islice(reader, options['batch_size']))
+                if not batch:
+                    break
+                created = self.import_batch(batch, row_number)
+                imported += created
+                rejected += len(batch) - created
+                row_number += len(batch)
+                if options['verbosity'] > 1:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'{row_number} rows read, {imported / elapsed:.0f} rows/sec')
+
+        attribute_index.invalidate()  # bulk_create sends no signals
+        bump_catalog_version()
+        if self.provider:
+            invalidate_provider_dashboards([self.provider.id])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} wines, rejected {rejected} rows in {elapsed:.2f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/sec).'
+        ))
+
+    def import_batch(self, batch, offset):
+        """Validate a batch against the model ranges in one vectorized pass and bulk insert the valid rows."""
+        width = max(self.columns) + 1
+        positions = [i for i, row in enumerate(batch) if len(row) >= width]
+        rows = [batch[i] for i in positions]
+        values = np.column_stack([
+            to_float_column([row[index] for row in rows]) for index in self.columns
+        ]) if rows else np.empty((0, len(ATTRIBUTE_FIELDS)))
+        in_range = np.all((values >= self.lower) & (values <= self.upper), axis=1)  # NaN compares False
+
+        attributes, wines = [], []
+        for row_index in np.flatnonzero(in_range):  # cheap vectorized filter first, then exact field checks
+            row = rows[row_index]
+            variety = row[self.variety_column].strip() if self.variety_column is not None else ''
+            if len(variety) > VARIETY_MAX_LENGTH:
+                continue
+            attribute = clean_attribute(row, self.columns)
+            if attribute is None:
+                continue
+            attributes.append(Attribute(**attribute))
+            wines.append(Wine(
+                name=f'{self.name_prefix} {offset + positions[row_index] + 1}',
+                harvest_year=self.options['harvest_year'],
+                maker=self.options['maker'],
+                variety=variety or self.options['variety'],
+                city_id=self.options['city'],
+                provider=self.provider,
+            ))
+
+        with transaction.atomic():
+            Attribute.objects.bulk_create(attributes)
+            for wine, attribute in zip(wines, attributes):
+                wine.attribute = attribute
+            Wine.objects.bulk_create(wines)
+            index_wines(wines)  # bulk_create sends no signals
+            record_wines(wines)
+            record_changes([wine.id for wine in wines], WineChange.CREATED)
+        return len(wines)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wines import facets
+
+
+class Command(BaseCommand):
+    help = "Rebuild the wine facet counts from live GROUP BY queries, or check them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the stored counts with the live ones and report drift')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            counts = facets.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(counts)} facet counts.'))
+            return
+
+        live = facets.live_counts()
+        stored = facets.stored_counts()
+        drift = sorted(key for key in live.keys() | stored.keys() if live[key] != stored[key])
+        for facet, value in drift:
+            self.stdout.write(f'{facet}={value}: stored {stored[(facet, value)]}, live {live[(facet, value)]}')
+        if drift:
+            raise CommandError(f'{len(drift)} facet counts differ from the live data.')
+        self.stdout.write(self.style.SUCCESS(f'All {len(live)} facet counts are consistent.'))
@@ -9,6 +9,21 @@ from users.models import User
 class Attribute(models.Model):
     """Model to store chemical attributes of wines."""
     
+    # The 11 lab measurements, in wine-quality dataset column order
+    MEASUREMENT_FIELDS = [
+        'fixed_acidity',
+        'volatile_acidity',
+        'citric_acid',
+        'residual_sugar',
+        'chlorides',
+        'free_sulfur_dioxide',
+        'total_sulfur_dioxide',
+        'density',
+        'pH',
+        'sulphates',
+        'alcohol',
+    ]
+    
     total_sulfur_dioxide = models.SmallIntegerField(
         validators=[MinValueValidator(0), MaxValueValidator(300)],
         help_text='Total sulfur dioxide (0-300 mg/L)'
@@ -71,13 +86,60 @@ class Attribute(models.Model):
         validators=[MinValueValidator(5.0), MaxValueValidator(20.0)],
         help_text='Alcohol (5.0-20.0 %vol)'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text='Date the attributes were last modified'
+    )
     
     class Meta:
         verbose_name = 'Attribute'
         verbose_name_plural = 'Attributes'
+        indexes = [ # Indexes for the most common range filters
+            models.Index(fields=['alcohol'], name='attribute_alcohol_idx'),
+            models.Index(fields=['pH'], name='attribute_ph_idx'),
+            models.Index(fields=['residual_sugar'], name='attribute_sugar_idx'),
+        ]
     
     def __str__(self):
         return f"Attributes (pH: {self.pH}, Alcohol: {self.alcohol}%)"
+    
+    @classmethod
+    def measurement_ranges(cls):
+        """Return the (min, max) lists of every measurement, read from the field validators."""
+        lower, upper = [], []
+        for name in cls.MEASUREMENT_FIELDS:
+            validators = cls._meta.get_field(name).validators
+            lower.append(next(float(v.limit_value) for v in validators if isinstance(v, MinValueValidator)))
+            upper.append(next(float(v.limit_value) for v in validators if isinstance(v, MaxValueValidator)))
+        return lower, upper
+
+
+class WineQuerySet(models.QuerySet):
+    """QuerySet helpers for wines."""
+
+    def with_related(self):
+        """Join the attribute, city and provider read by WineReadSerializer in a single query."""
+        return self.select_related('attribute', 'city', 'provider')
+
+    def for_fields(self, fields):
+        """
+        Restrict the query to the columns and joins needed to serialize `fields`.
+        Ordering columns, timestamps and the provider and attribute ids are always
+        loaded so pagination, ownership and conditional request checks never hit a
+        deferred field.
+        """
+        columns = {'id', 'harvest_year', 'name', 'provider', 'attribute', 'updated_at'}
+        columns.update(field for field in fields if field not in ('attribute', 'city', 'provider'))
+        relations = [relation for relation in ('attribute', 'city', 'provider') if relation in fields]
+        if 'city' in relations:
+            columns.update(['city__name', 'city__country_id', 'city__updated_at'])
+        if 'provider' in relations:
+            columns.update(['provider__name', 'provider__username', 'provider__updated_at'])
+        queryset = self.only(*columns, *relations)
+        if relations:  # select_related() without arguments would follow every foreign key
+            queryset = queryset.select_related(*relations)
+        return queryset
 
 
 class Wine(models.Model):
@@ -142,13 +204,22 @@ class Wine(models.Model):
     auto_now_add=True,
     help_text='Date the wine was added'
     )
-    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text='Date the wine was last modified'
+    )
+
+    objects = WineQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Wine'
         verbose_name_plural = 'Wines'
-        ordering = ['-harvest_year', 'name']  
+        ordering = ['-harvest_year', 'name', 'id']  
         indexes = [
             models.Index(fields=['harvest_year', 'variety']),
+            models.Index(fields=['variety', 'harvest_year'], name='wine_variety_year_idx'), # Index for variety filters
+            models.Index(fields=['-harvest_year', 'name', 'id'], name='wine_keyset_idx'), # Index for cursor pagination
         ]
     
     def __str__(self):
@@ -156,4 +227,42 @@ class Wine(models.Model):
     
     def get_age(self):
         """Calculate the age of the wine based on the harvest year."""
-        return datetime.now().year - self.harvest_year
\ No newline at end of file
+        return datetime.now().year - self.harvest_year
+
+class WineFacetCount(models.Model):
+    """
+    Wine counts per facet value (variety, harvest year, country, provider).
+    Maintained incrementally by the Wine signals and rebuilt by `rebuild_wine_facets`.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_wine_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class WineChange(models.Model):
+    """
+    Outbox of wine creates, updates and deletes, read by the changes feed.
+    The id is the sync cursor; deletes stay as tombstones because the wine row is gone.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    wine_id = models.IntegerField(db_index=True) # Not a foreign key: tombstones outlive the wine
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.action} wine {self.wine_id}"
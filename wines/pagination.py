@@ -0,0 +1,154 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Composite keyset pagination.
+
+    The cursor carries the value of every `ordering` field of the last (or first)
+    row of the page, and the next page is filtered with the expanded row comparison
+    (a < x) OR (a = x AND b > y) OR ..., so every page is an index seek: no OFFSET,
+    whatever the depth and however many rows share the leading key. The last
+    ordering field must be unique.
+    """
+    ordering = ('id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, field.lstrip('-')) for field in self.keys]
+        payload = json.dumps({'v': values, 'r': reverse}, default=str, separators=(',', ':'))
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        """Return (values, reverse) from the cursor param, or None on the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+            if len(values) != len(self.keys):
+                raise ValueError(values)
+            return [self.to_python(model, field, value) for field, value in zip(self.keys, values)], reverse
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def to_python(model, field, value):
+        """Cursor values go through JSON; model fields restore their type (dates, decimals)."""
+        try:
+            return model._meta.get_field(field.lstrip('-')).to_python(value)
+        except FieldDoesNotExist:  # annotation, e.g. search_rank
+            return value
+
+    @staticmethod
+    def after(ordering, values):
+        """Rows strictly after `values` in `ordering`."""
+        clauses, equal = [], {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            clauses.append(Q(**equal, **{f'{name}__{"lt" if field.startswith("-") else "gt"}': value}))
+            equal[name] = value
+        first = ordering[0].lstrip('-')
+        bound = Q(**{f'{first}__{"lte" if ordering[0].startswith("-") else "gte"}': values[0]})
+        return bound & reduce(or_, clauses)  # the redundant bound lets the database seek on the index
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.keys = tuple(self.get_ordering(request, queryset, view))
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor[1])
+
+        ordering = self.keys
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        if cursor:
+            queryset = queryset.filter(self.after(ordering, cursor[0]))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'The pagination cursor value.', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results to return per page.', 'schema': {'type': 'integer'}},
+        ]
+
+
+class WineCursorPagination(KeysetPagination):
+    """
+    Keyset pagination for wine listings.
+    Follows Wine.Meta.ordering with id as a tiebreaker, served by the wine_keyset_idx index.
+    """
+    ordering = ('-harvest_year', 'name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        """Order full-text search results by relevance instead of the default ordering."""
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', 'id')
+        return super().get_ordering(request, queryset, view)
@@ -1,6 +1,5 @@
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
-from coltns.models import ProviderWine
 
 class IsClient(permissions.BasePermission):
     """
@@ -32,5 +31,5 @@ class IsProviderWineOwner(BasePermission):
         return (
             request.user
             and request.user.is_authenticated
-            and obj.provider == request.user
+            and obj.provider_id == request.user.id
         )
\ No newline at end of file
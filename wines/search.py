@@ -0,0 +1,102 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Wine
+
+FTS_TABLE = 'wines_wine_fts'
+SEARCH_FIELDS = ['name', 'maker', 'variety', 'description']
+SEARCH_CONFIG = 'english'
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+
+
+def create_search_index(using='default'):
+    """
+    Create the full-text index if it does not exist yet.
+    SQLite gets an FTS5 table filled from the current catalog, PostgreSQL a GIN
+    index over the same tsvector expression used by search().
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            if FTS_TABLE in connection.introspection.table_names(cursor):
+                return
+            columns = ', '.join(SEARCH_FIELDS)
+            cursor.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns})')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {Wine._meta.db_table}'
+            )
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Wine._meta.db_table)
+        if 'wine_search_gin' not in constraints:
+            with connection.schema_editor() as schema_editor:
+                schema_editor.add_index(Wine, GinIndex(search_vector(), name='wine_search_gin'))
+
+
+def index_wines(wines, using='default'):
+    """Write the searchable text of `wines` to the FTS5 table. No-op outside SQLite."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not wines:
+        return
+    columns = ', '.join(SEARCH_FIELDS)
+    placeholders = ', '.join(['%s'] * (len(SEARCH_FIELDS) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(wine.id,) for wine in wines])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})',
+            [(wine.id, *(getattr(wine, field) for field in SEARCH_FIELDS)) for wine in wines],
+        )
+
+
+def unindex_wine(wine_id, using='default'):
+    """Drop one wine from the FTS5 table. No-op outside SQLite."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [wine_id])
+
+
+def fts_query(text):
+    """Quote every word so user input can't break FTS5 syntax; the last word matches as a prefix."""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+
+def search(queryset, text):
+    """
+    Filter `queryset` to wines matching `text` and annotate `search_rank`,
+    where lower values are more relevant.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        vector = search_vector()
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.alias(search=vector).filter(search=query).annotate(
+            search_rank=SearchRank(vector, query) * -1
+        ).order_by('search_rank', 'id')
+
+    # SQLite: match and rank inside the same SQL as the caller's filters, so scoping and
+    # pagination apply to the full match set. bm25() is negative, lower is more relevant.
+    match = fts_query(text)
+    if match is None:
+        return queryset.none()
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    rank = RawSQL(
+        f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{Wine._meta.db_table}"."id"',
+        [match],
+        output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('search_rank', 'id')
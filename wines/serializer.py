@@ -1,5 +1,15 @@
+from operator import attrgetter
+
+from django.db import models, transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Wine, Attribute
+from .models import Wine, Attribute, WineChange
+from .caching import bump_catalog_version, invalidate_wine_details
+from .changes import record_changes
+from .dashboard import invalidate_provider_dashboards
+from .facets import FACETS, apply_deltas, facet_counter, record_wines, wine_facet_rows
+from .search import SEARCH_FIELDS, index_wines
+from .similarity import attribute_index
 from locations.models import City
 from locations.serializer import CitySerializer
        
@@ -22,6 +32,36 @@ class AttributeSerializer(serializers.ModelSerializer):
             'alcohol'
         ]
         read_only_fields = ['id']
+
+
+class NumericAttributeSerializer(serializers.BaseSerializer):
+    """
+    Read-only fast path for attributes with the measurements as JSON numbers.
+
+    Skips the per-field DecimalField quantize-and-format work: the values are read
+    with one precomputed attrgetter and converted with int/float. Every measurement
+    has at most 5 decimal places, so the float's shortest repr is the stored value.
+    """
+    field_names = AttributeSerializer.Meta.fields
+    converters = [
+        int if name == 'id' or isinstance(Attribute._meta.get_field(name), models.IntegerField) else float
+        for name in field_names
+    ]
+    getter = attrgetter(*field_names)
+
+    def to_representation(self, instance):
+        return {
+            name: convert(value)
+            for name, convert, value in zip(self.field_names, self.converters, self.getter(instance))
+        }
+
+    @classmethod
+    def from_strings(cls, data):
+        """Convert an AttributeSerializer payload (decimals as strings) to numbers."""
+        return {
+            name: None if data.get(name) is None else convert(data[name])
+            for name, convert in zip(cls.field_names, cls.converters)
+        }
         
 class WineReadSerializer(serializers.ModelSerializer):
     """Serializer for reading wine data."""
@@ -43,6 +83,48 @@ class WineReadSerializer(serializers.ModelSerializer):
             'provider',
             'added_date',
         ]
+        expandable_fields = ['attribute', 'city', 'provider']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            selected = self.get_selected_fields(request)
+            for field_name in set(self.fields) - selected:
+                self.fields.pop(field_name)
+            if 'attribute' in self.fields and self.wants_numbers(request):
+                self.fields['attribute'] = NumericAttributeSerializer(read_only=True)
+
+    @staticmethod
+    def wants_numbers(request):
+        """?decimals=number opts in to attribute measurements as JSON numbers instead of strings."""
+        return request.query_params.get('decimals') == 'number'
+
+    @staticmethod
+    def numeric_attribute(data):
+        """Numeric form of an already serialized attribute, for cached payloads."""
+        return NumericAttributeSerializer.from_strings(data)
+
+    @classmethod
+    def get_selected_fields(cls, request):
+        """
+        Resolve the ?fields= and ?expand= query params into the set of fields to serialize.
+        Without either param every field is returned. Nested relations are only
+        included when named in one of them.
+        """
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        if not fields and not expand:
+            return set(cls.Meta.fields)
+
+        if fields:
+            selected = {name.strip() for name in fields.split(',')}
+        else:
+            selected = set(cls.Meta.fields) - set(cls.Meta.expandable_fields)
+        if expand:
+            selected.update(name.strip() for name in expand.split(','))
+        return selected & set(cls.Meta.fields)
+
     def get_provider(self, obj):
         provider = getattr(obj, 'provider', None)
         if not provider:
@@ -88,4 +170,141 @@ class WineWriteSerializer(serializers.ModelSerializer):
                 setattr(instance.attribute, field, value)
             instance.attribute.save()
                 
-        return super().update(instance, validated_data)
\ No newline at end of file
+        return super().update(instance, validated_data)
+
+
+class WineBulkItemSerializer(WineWriteSerializer):
+    """
+    Serializer for one wine of a bulk create.
+    Cities are resolved up front for the whole batch, so validation runs no queries.
+    """
+    city_id = serializers.IntegerField()
+
+    def validate_city_id(self, value):
+        if value not in self.context['city_ids']:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return value
+
+    @staticmethod
+    def get_city_context(items):
+        """Existing city ids of the batch, parsed like the city_id field does, in one query."""
+        city_ids = set()
+        for item in items:
+            try:
+                city_ids.add(int(item.get('city_id')))
+            except (AttributeError, TypeError, ValueError):
+                continue
+        return {'city_ids': set(City.objects.filter(id__in=city_ids).values_list('id', flat=True))}
+
+    @classmethod
+    def bulk_create(cls, items, provider):
+        """
+        Validate every item in one pass and insert the valid ones with bulk_create.
+        Returns the created wines and a list of {'index', 'errors'} for rejected items.
+        """
+        context = cls.get_city_context(items)
+
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = cls(data=item, context=context)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        with transaction.atomic():
+            attributes = Attribute.objects.bulk_create(
+                [Attribute(**data['attribute']) for data in valid]
+            )
+            wines = Wine.objects.bulk_create([
+                Wine(
+                    attribute=attribute,
+                    provider=provider,
+                    **{field: value for field, value in data.items() if field != 'attribute'}
+                )
+                for data, attribute in zip(valid, attributes)
+            ])
+            index_wines(wines)  # bulk_create sends no signals
+            record_wines(wines)
+            record_changes([wine.id for wine in wines], WineChange.CREATED)
+            transaction.on_commit(attribute_index.invalidate)
+            transaction.on_commit(bump_catalog_version)
+            invalidate_provider_dashboards([provider.id])
+        return wines, errors
+
+
+class WineBulkUpdateItemSerializer(WineBulkItemSerializer):
+    """
+    Serializer for one wine of a bulk partial update ({"id": ..., <changed fields>}).
+    Validated against the already loaded wine, so validation runs no queries.
+    """
+
+    @classmethod
+    def bulk_update(cls, items, provider):
+        """
+        Apply partial updates to the provider's wines in one transaction.
+        Ownership is checked for every id with one query that also locks the rows, so the
+        values written back for unchanged items are the current ones, and Wine and Attribute
+        are written with bulk_update on the changed columns only. An id may appear once per
+        batch. Returns the updated wines and a list of {'index', 'errors'} for rejected items.
+        """
+        ids = {item.get('id') for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)}
+        context = cls.get_city_context(items)
+
+        with transaction.atomic():
+            wines = Wine.objects.select_related('attribute').select_for_update().filter(provider=provider).in_bulk(ids)
+            updates, errors = {}, []
+            for index, item in enumerate(items):
+                wine = wines.get(item.get('id')) if isinstance(item, dict) else None
+                if wine is None:
+                    errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+                    continue
+                if wine.id in updates:
+                    errors.append({'index': index, 'errors': {'id': ['Duplicate id in the batch.']}})
+                    continue
+                serializer = cls(wine, data=item, partial=True, context=context)
+                if serializer.is_valid():
+                    updates[wine.id] = serializer.validated_data
+                else:
+                    errors.append({'index': index, 'errors': serializer.errors})
+            if not updates:
+                return [], errors
+
+            updated = [wines[wine_id] for wine_id in updates]
+            facet_fields = {lookup.split('__')[0] for lookup in FACETS.values()} | {'city_id'}
+            before = wine_facet_rows(updated)
+            wine_fields, attribute_fields = set(), set()
+            for wine in updated:
+                data = dict(updates[wine.id])
+                for field, value in data.pop('attribute', {}).items():
+                    setattr(wine.attribute, field, value)
+                    attribute_fields.add(field)
+                for field, value in data.items():
+                    setattr(wine, field, value)
+                    wine_fields.add(field)
+
+            now = timezone.now()  # bulk_update skips auto_now
+            if wine_fields:
+                for wine in updated:
+                    wine.updated_at = now
+                Wine.objects.bulk_update(updated, [*wine_fields, 'updated_at'])
+            if attribute_fields:
+                attributes = [wine.attribute for wine in updated]
+                for attribute in attributes:
+                    attribute.updated_at = now
+                Attribute.objects.bulk_update(attributes, [*attribute_fields, 'updated_at'])
+
+            # bulk_update sends no signals
+            if wine_fields & set(SEARCH_FIELDS):
+                index_wines(updated)
+            if wine_fields & facet_fields:
+                counter = facet_counter(wine_facet_rows(updated))
+                counter.subtract(facet_counter(before))
+                apply_deltas(counter)
+            record_changes(list(updates), WineChange.UPDATED)
+            transaction.on_commit(lambda: invalidate_wine_details(list(updates)))
+            if attribute_fields:
+                transaction.on_commit(attribute_index.invalidate)
+            transaction.on_commit(bump_catalog_version)
+            invalidate_provider_dashboards([provider.id])
+        return updated, errors
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from locations.models import City
+from users.models import User
+from . import facets
+from .caching import bump_catalog_version, invalidate_wine_details
+from .changes import record_changes
+from .dashboard import invalidate_provider_dashboards
+from .models import Attribute, Wine, WineChange
+from .search import create_search_index, index_wines, unindex_wine
+from .similarity import attribute_index
+
+
+@receiver(post_save, sender=Attribute)
+def update_attribute_index(sender, instance, **kwargs):
+    """Refresh the similarity index row once the write is committed."""
+    transaction.on_commit(lambda: attribute_index.upsert(instance))
+
+
+@receiver(post_delete, sender=Attribute)
+def remove_from_attribute_index(sender, instance, **kwargs):
+    """Drop the similarity index row once the delete is committed."""
+    attribute_id = instance.id
+    transaction.on_commit(lambda: attribute_index.remove(attribute_id))
+
+
+@receiver(post_save, sender=Wine)
+def update_search_index(sender, instance, using, **kwargs):
+    """Keep the full-text index in the same transaction as the wine write."""
+    index_wines([instance], using=using)
+
+
+@receiver(post_delete, sender=Wine)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    unindex_wine(instance.id, using=using)
+
+
+@receiver(pre_save, sender=Wine)
+def remember_facet_values(sender, instance, **kwargs):
+    """Keep the facet values stored before an update so post_save can move the counts."""
+    instance._facet_rows_before = []
+    if not instance._state.adding and instance.pk:
+        instance._facet_rows_before = list(
+            Wine.objects.filter(pk=instance.pk).values(*facets.FACETS.values())
+        )
+
+
+@receiver(post_save, sender=Wine)
+def update_facet_counts(sender, instance, **kwargs):
+    counter = facets.facet_counter(facets.wine_facet_rows([instance]))
+    counter.subtract(facets.facet_counter(getattr(instance, '_facet_rows_before', [])))
+    facets.apply_deltas(counter)
+
+
+@receiver(post_delete, sender=Wine)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    facets.record_wines([instance], delta=-1)
+
+
+@receiver([post_save, post_delete], sender=Wine)
+@receiver([post_save, post_delete], sender=Attribute)
+@receiver([post_save, post_delete], sender=City)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any change to data shown in wine listings invalidates the cached responses."""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_catalog_cache_for_provider(sender, instance, update_fields=None, **kwargs):
+    """Provider names appear in wine listings; logins only touch last_login and are ignored."""
+    if instance.role == 'provider' and update_fields != frozenset(['last_login']):
+        transaction.on_commit(bump_catalog_version)
+
+
+def invalidate_wine_details_on_commit(wine_ids):
+    wine_ids = list(wine_ids)
+    if wine_ids:
+        transaction.on_commit(lambda: invalidate_wine_details(wine_ids))
+
+
+@receiver([post_save, post_delete], sender=Wine)
+def invalidate_wine_detail(sender, instance, **kwargs):
+    invalidate_wine_details_on_commit([instance.id])
+
+
+@receiver(post_save, sender=Attribute)
+def invalidate_attribute_wine_detail(sender, instance, **kwargs):
+    invalidate_wine_details_on_commit(Wine.objects.filter(attribute_id=instance.id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=City)
+def invalidate_city_wine_details(sender, instance, **kwargs):
+    invalidate_wine_details_on_commit(Wine.objects.filter(city_id=instance.id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_provider_wine_details(sender, instance, update_fields=None, **kwargs):
+    if instance.role == 'provider' and update_fields != frozenset(['last_login']):
+        invalidate_wine_details_on_commit(Wine.objects.filter(provider_id=instance.id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Wine)
+def record_wine_change(sender, instance, created, **kwargs):
+    record_changes([instance.id], WineChange.CREATED if created else WineChange.UPDATED)
+
+
+@receiver(post_delete, sender=Wine)
+def record_wine_tombstone(sender, instance, **kwargs):
+    record_changes([instance.id], WineChange.DELETED)
+
+
+@receiver(post_save, sender=Attribute)
+def record_attribute_change(sender, instance, created, **kwargs):
+    """Attributes are part of the wine payload; a new attribute has no wine yet."""
+    if not created:
+        record_changes(Wine.objects.filter(attribute_id=instance.id).values_list('id', flat=True), WineChange.UPDATED)
+
+
+@receiver([post_save, post_delete], sender=Wine)
+def invalidate_wine_provider_dashboard(sender, instance, **kwargs):
+    """Also covers the previous provider when a wine changes hands."""
+    before = getattr(instance, '_facet_rows_before', [])
+    invalidate_provider_dashboards([instance.provider_id, *(row['provider_id'] for row in before)])
+
+
+def create_search_index_after_migrate(sender, using, **kwargs):
+    """Connected to post_migrate in WinesConfig.ready()."""
+    create_search_index(using=using)
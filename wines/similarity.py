@@ -0,0 +1,141 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from .models import Attribute
+from .snapshot import attribute_snapshot
+
+# Writes saved this long before a snapshot started reading may still have been uncommitted
+SNAPSHOT_GRACE = timedelta(seconds=60)
+
+
+class AttributeIndex:
+    """
+    Nearest-neighbour queries over the Attribute measurements.
+
+    Each measurement is scaled to [0, 1] using the model validator ranges, so the
+    normalization does not depend on the data. Rows live in a base, sorted by id, and an
+    overlay of rows written since the base was read, which hides the base rows it replaces.
+
+    When a snapshot has been built (build_wine_snapshot), the base is its memory-mapped
+    columns, shared by every worker through the page cache. Each worker only keeps a mask
+    of hidden base rows and an overlay read from the attributes updated since the snapshot
+    started, and deleted attributes are hidden by checking the base ids against the live
+    ones. Without a snapshot the base is read from the database into the worker.
+
+    The Attribute signals keep the overlay up to date, and the index is rebuilt after
+    `max_age` seconds to pick up writes made by other processes or by bulk inserts that
+    send no signals.
+    """
+    max_age = 300
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._ids = None
+        self._columns = []
+        self._hidden = None
+        self._overlay = {}  # attribute id -> normalized vector
+        lower, upper = Attribute.measurement_ranges()
+        self._lower = np.array(lower)
+        self._scale = np.array(upper) - self._lower
+
+    def _normalize(self, values):
+        return (np.asarray(values, dtype=np.float64) - self._lower) / self._scale
+
+    def _build(self):
+        fields = Attribute.MEASUREMENT_FIELDS
+        if attribute_snapshot.exists():
+            ids = attribute_snapshot.column('id')
+            columns = list(attribute_snapshot.measurements().values())
+            live = np.fromiter(Attribute.objects.values_list('id', flat=True).iterator(chunk_size=5000), dtype=np.int64)
+            hidden = ~np.isin(ids, live)
+            newer = Attribute.objects.filter(updated_at__gte=attribute_snapshot.built_at - SNAPSHOT_GRACE)
+        else:
+            rows = list(Attribute.objects.order_by('id').values_list('id', *fields).iterator(chunk_size=5000))
+            data = np.array(rows, dtype=np.float64).reshape(len(rows), len(fields) + 1)
+            ids = data[:, 0].astype(np.int64)
+            columns = [np.ascontiguousarray(data[:, i + 1]) for i in range(len(fields))]
+            hidden = np.zeros(len(ids), dtype=bool)
+            newer = Attribute.objects.none()
+        self._ids, self._columns, self._hidden, self._overlay = ids, columns, hidden, {}
+        for attribute_id, *values in newer.values_list('id', *fields).iterator(chunk_size=5000):
+            self._set(attribute_id, self._normalize(values))
+        self._built_at = time.monotonic()
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self._build()
+
+    def _base_row(self, attribute_id):
+        row = int(np.searchsorted(self._ids, attribute_id))
+        return row if row < len(self._ids) and self._ids[row] == attribute_id else None
+
+    def _set(self, attribute_id, vector):
+        self._overlay[attribute_id] = vector
+        row = self._base_row(attribute_id)
+        if row is not None:
+            self._hidden[row] = True
+
+    def _vector(self, attribute_id):
+        if attribute_id in self._overlay:
+            return self._overlay[attribute_id]
+        row = self._base_row(attribute_id)
+        if row is None or self._hidden[row]:
+            return None
+        return self._normalize([column[row] for column in self._columns])
+
+    def invalidate(self):
+        """Drop the index so the next query rebuilds it."""
+        with self._lock:
+            self._built_at = None
+
+    def upsert(self, attribute):
+        """Add or refresh one attribute row. No-op until the index has been built."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._set(attribute.id, self._normalize([getattr(attribute, name) for name in Attribute.MEASUREMENT_FIELDS]))
+
+    def remove(self, attribute_id):
+        """Remove one attribute row. No-op until the index has been built."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._overlay.pop(attribute_id, None)
+            row = self._base_row(attribute_id)
+            if row is not None:
+                self._hidden[row] = True
+
+    def nearest(self, attribute_id, k):
+        """
+        Return up to k (attribute_id, distance) pairs closest to `attribute_id`,
+        nearest first, excluding the attribute itself.
+        """
+        with self._lock:
+            self._ensure_built()
+            vector = self._vector(attribute_id)
+            if vector is None:
+                return []
+            distances = np.zeros(len(self._ids))
+            for i, column in enumerate(self._columns):  # column by column: no normalized copy of the base
+                distances += ((column - self._lower[i]) / self._scale[i] - vector[i]) ** 2
+            distances[self._hidden] = np.inf
+            ids = self._ids
+            if self._overlay:
+                overlay = np.array(list(self._overlay.values()))
+                ids = np.concatenate([ids, np.fromiter(self._overlay, dtype=np.int64, count=len(self._overlay))])
+                distances = np.concatenate([distances, ((overlay - vector) ** 2).sum(axis=1)])
+            distances = np.sqrt(distances)
+            distances[ids == attribute_id] = np.inf
+            k = min(k, int(np.isfinite(distances).sum()))
+            if k <= 0:
+                return []
+            candidates = np.argpartition(distances, k - 1)[:k]
+            candidates = candidates[np.argsort(distances[candidates])]
+            return [(int(ids[i]), float(distances[i])) for i in candidates]
+
+
+attribute_index = AttributeIndex()
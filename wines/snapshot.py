@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Attribute
+
+VERSION_FILE = 'VERSION'
+COLUMNS = ['id', 'wine_id', *Attribute.MEASUREMENT_FIELDS]
+CHUNK_SIZE = 5000
+
+
+def snapshot_dir():
+    """WINE_SNAPSHOT_DIR, or var/wine-snapshot under the project."""
+    return Path(getattr(settings, 'WINE_SNAPSHOT_DIR', settings.BASE_DIR / 'var' / 'wine-snapshot'))
+
+
+def build_snapshot(directory=None, keep=2):
+    """
+    Write the Attribute table, ordered by id, with the id of each attribute's wine (-1 if
+    none), as one .npy file per column in a new version directory, then point VERSION at
+    it atomically. Rows are streamed in chunks into preallocated arrays. The version is
+    the time_ns at which the read started, so readers know which writes it may miss.
+    The `keep` newest versions are kept so workers still mapping the previous one are
+    unaffected. Returns (version, row count).
+    """
+    directory = Path(directory or snapshot_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    version = str(time.time_ns())
+    capacity = max(Attribute.objects.count(), 1)
+    data = np.empty((capacity, len(COLUMNS)))
+    size = 0
+
+    rows = (
+        Attribute.objects.order_by('id')
+        .values_list('id', 'wine__id', *Attribute.MEASUREMENT_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for chunk in iter(lambda: list(islice(rows, CHUNK_SIZE)), []):
+        if size + len(chunk) > capacity:  # rows inserted since the count
+            capacity = max(capacity * 2, size + len(chunk))
+            data = np.resize(data, (capacity, len(COLUMNS)))
+        data[size:size + len(chunk)] = np.array(chunk, dtype=np.float64)  # a missing wine id becomes nan
+        size += len(chunk)
+
+    target = directory / version
+    target.mkdir()
+    data = data[:size]
+    data[:, 1] = np.nan_to_num(data[:, 1], nan=-1)
+    for i, column in enumerate(COLUMNS):
+        values = data[:, i].astype(np.int64) if column in ('id', 'wine_id') else data[:, i]
+        np.save(target / f'{column}.npy', np.ascontiguousarray(values))
+
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp, directory / VERSION_FILE)
+
+    versions = sorted((path for path in directory.iterdir() if path.is_dir() and path.name.isdigit()), key=lambda p: int(p.name))
+    for old in versions[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return version, size
+
+
+class AttributeSnapshot:
+    """
+    Read-only, memory-mapped view of the latest snapshot.
+
+    Columns are mapped with np.load(mmap_mode='r'), so every worker shares the same
+    page-cache pages instead of holding its own copy. The VERSION file is checked at
+    most every `check_interval` seconds and the columns are remapped when it changes.
+    """
+    check_interval = 5
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._version = None
+        self._columns = {}
+        self._checked_at = 0.0
+
+    @property
+    def directory(self):
+        return Path(self._directory or snapshot_dir())
+
+    def _current_version(self):
+        try:
+            return (self.directory / VERSION_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            version = self._current_version()
+            if version is None:
+                raise FileNotFoundError(f'No attribute snapshot in {self.directory}; run build_wine_snapshot.')
+            if version != self._version:
+                self._columns = {
+                    column: np.load(self.directory / version / f'{column}.npy', mmap_mode='r')
+                    for column in COLUMNS
+                }
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def exists(self):
+        """Whether a snapshot has been built; readers fall back to the database otherwise."""
+        return self._current_version() is not None
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
+
+    @property
+    def built_at(self):
+        """When the snapshot started reading the table, as an aware datetime."""
+        return datetime.fromtimestamp(int(self.version) / 1e9, tz=timezone.utc)
+
+    def column(self, name):
+        """One column as a read-only memory-mapped array."""
+        self._refresh()
+        return self._columns[name]
+
+    def measurements(self, fields=None):
+        """Mapping of measurement name to column, all measurements by default."""
+        self._refresh()
+        return {name: self._columns[name] for name in fields or Attribute.MEASUREMENT_FIELDS}
+
+
+attribute_snapshot = AttributeSnapshot()
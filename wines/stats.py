@@ -0,0 +1,173 @@
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+
+from .caching import get_catalog_version
+from .models import Attribute, Wine
+
+HISTOGRAM_BINS = 10
+PERCENTILES = [10, 50, 90]
+# group_by param -> Wine lookup
+GROUPS = {
+    'variety': 'variety',
+    'harvest_year': 'harvest_year',
+}
+
+
+# catalog version, sha256 of the variety: raw text is not a valid memcached key
+VARIETY_DISTRIBUTION_KEY = 'wines:variety-distribution:{}:{}'
+DISTRIBUTION_TIMEOUT = 3600
+# Percentile points kept per variety baseline
+QUANTILE_GRID = np.linspace(0, 100, 101)
+
+
+def histogram_edges():
+    """Fixed bin edges per measurement, spanning the model validator ranges."""
+    lower, upper = Attribute.measurement_ranges()
+    return np.linspace(lower, upper, HISTOGRAM_BINS + 1, axis=1)
+
+
+def measurement_stats(queryset, group_by):
+    """
+    Mean, std, min, max, percentiles and a fixed-bin histogram of every Attribute
+    measurement for each value of `group_by`, from a single values_list query.
+    """
+    lookup = GROUPS[group_by]
+    fields = [f'attribute__{name}' for name in Attribute.MEASUREMENT_FIELDS]
+    rows = list(queryset.order_by().values_list(lookup, *fields))
+    edges = histogram_edges()
+    result = {
+        'group_by': group_by,
+        'bins': {name: np.round(edges[i], 6).tolist() for i, name in enumerate(Attribute.MEASUREMENT_FIELDS)},
+        'groups': [],
+    }
+    if not rows:
+        return result
+
+    keys = np.array([row[0] for row in rows], dtype=object)
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    group_keys, starts = np.unique(keys, return_index=True)
+
+    # Bin index of every value at once; values on the upper edge go to the last bin
+    lower, upper = edges[:, 0], edges[:, -1]
+    bins = np.clip(((values - lower) / (upper - lower) * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+
+    for key, start, end in zip(group_keys, starts, list(starts[1:]) + [len(values)]):
+        group = values[start:end]
+        mean, std = group.mean(axis=0), group.std(axis=0)
+        low, high = group.min(axis=0), group.max(axis=0)
+        percentiles = np.percentile(group, PERCENTILES, axis=0)
+        measurements = {}
+        for i, name in enumerate(Attribute.MEASUREMENT_FIELDS):
+            measurements[name] = {
+                'mean': round(float(mean[i]), 6),
+                'std': round(float(std[i]), 6),
+                'min': float(low[i]),
+                'max': float(high[i]),
+                **{f'p{p}': round(float(percentiles[j, i]), 6) for j, p in enumerate(PERCENTILES)},
+                'histogram': np.bincount(bins[start:end, i], minlength=HISTOGRAM_BINS).tolist(),
+            }
+        result['groups'].append({'value': key, 'count': int(end - start), 'measurements': measurements})
+    return result
+
+
+def variety_measurements(varieties):
+    """Measurement matrix (one column per measurement) of every wine of each variety, in one query."""
+    width = len(Attribute.MEASUREMENT_FIELDS)
+    fields = [f'attribute__{name}' for name in Attribute.MEASUREMENT_FIELDS]
+    rows = Wine.objects.filter(variety__in=varieties).order_by().values_list('variety', *fields)
+    grouped = {variety: [] for variety in varieties}
+    for variety, *values in rows:
+        grouped[variety].append(values)
+    return {
+        variety: np.array(values, dtype=np.float64).reshape(len(values), width)
+        for variety, values in grouped.items()
+    }
+
+
+def variety_distributions(varieties):
+    """
+    Summary of the measurements of every requested variety: count, mean, std and the
+    QUANTILE_GRID percentiles (Hazen) of each measurement, so the cached entry has a fixed
+    size however many wines the variety has. Cached per variety and catalog version; the
+    missing ones are read together.
+    """
+    version = get_catalog_version()
+    keys = {
+        variety: VARIETY_DISTRIBUTION_KEY.format(version, hashlib.sha256(variety.encode()).hexdigest())
+        for variety in varieties
+    }
+    cached = cache.get_many(keys.values())
+    distributions = {variety: cached[key] for variety, key in keys.items() if key in cached}
+
+    missing = [variety for variety in varieties if variety not in distributions]
+    if missing:
+        for variety, matrix in variety_measurements(missing).items():
+            distributions[variety] = {
+                'count': len(matrix),
+                'mean': matrix.mean(axis=0) if len(matrix) else None,
+                'std': matrix.std(axis=0) if len(matrix) else None,
+                'quantiles': np.percentile(matrix, QUANTILE_GRID, axis=0, method='hazen') if len(matrix) else None,
+            }
+        cache.set_many({keys[variety]: distributions[variety] for variety in missing}, DISTRIBUTION_TIMEOUT)
+    return distributions
+
+
+def percentile_ranks(quantiles, count, values):
+    """
+    Mid-rank percentile of `values` interpolated on one measurement's quantile curve.
+    Ties span a flat run of the curve, so the rank is the middle of the run, read from
+    both ends; the clamped tails of the Hazen curve are cut at half a sample.
+    """
+    right = np.interp(values, quantiles, QUANTILE_GRID)
+    left = 100 - np.interp(-values, -quantiles[::-1], 100 - QUANTILE_GRID[::-1])
+    low, high = 50 / count, 100 - 50 / count
+    ranks = (np.clip(left, low, high) + np.clip(right, low, high)) / 2
+    return np.where(values < quantiles[0], 0.0, np.where(values > quantiles[-1], 100.0, ranks))
+
+
+def compare_wines(wines):
+    """
+    Measurements of `wines` with the z-score and percentile rank of each value within
+    the wine's variety. Wines of the same variety are scored together as arrays.
+    """
+    distributions = variety_distributions({wine.variety for wine in wines})
+    values = np.array(
+        [[getattr(wine.attribute, name) for name in Attribute.MEASUREMENT_FIELDS] for wine in wines],
+        dtype=np.float64,
+    ).reshape(len(wines), len(Attribute.MEASUREMENT_FIELDS))
+    z_scores = np.zeros_like(values)
+    percentiles = np.zeros_like(values)
+    varieties = np.array([wine.variety for wine in wines], dtype=object)
+
+    for variety, baseline in distributions.items():
+        rows = np.flatnonzero(varieties == variety)
+        if not len(rows) or not baseline['count']:
+            continue
+        mean, std = baseline['mean'], baseline['std']
+        z_scores[rows] = np.divide(values[rows] - mean, std, out=np.zeros((len(rows), len(mean))), where=std > 0)
+        for column in range(len(mean)):
+            percentiles[rows, column] = percentile_ranks(
+                baseline['quantiles'][:, column], baseline['count'], values[rows, column]
+            )
+
+    results = []
+    for i, wine in enumerate(wines):
+        results.append({
+            'id': wine.id,
+            'name': wine.name,
+            'variety': wine.variety,
+            'baseline_count': distributions[wine.variety]['count'],
+            'measurements': {
+                name: {
+                    'value': float(values[i, j]),
+                    'z_score': round(float(z_scores[i, j]), 4),
+                    'percentile': round(float(percentiles[i, j]), 2),
+                }
+                for j, name in enumerate(Attribute.MEASUREMENT_FIELDS)
+            },
+        })
+    return results
@@ -1,3 +1,862 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from coltns.models import ClientCollection, ClientCollectionWine, ProviderCollection, ProviderCollectionWine
+from comments.models import WineComment
+from locations.models import Country, City
+from users.models import User
+from .caching import get_detail_stats
+from .changes import GAP_GRACE
+from .filters import WineFilterBackend
+from .models import Wine, Attribute, WineChange
+from .permissions import IsClient
+from .similarity import attribute_index
+from .snapshot import AttributeSnapshot
+
+
+ATTRIBUTE_DATA = {
+    'total_sulfur_dioxide': 34,
+    'fixed_acidity': Decimal('7.40'),
+    'volatile_acidity': Decimal('0.70'),
+    'free_sulfur_dioxide': 11,
+    'citric_acid': Decimal('0.000'),
+    'residual_sugar': Decimal('1.90'),
+    'chlorides': Decimal('0.0760'),
+    'density': Decimal('0.99780'),
+    'pH': Decimal('3.51'),
+    'sulphates': Decimal('0.56'),
+    'alcohol': Decimal('9.40'),
+}
+
+
+class WineTestMixin:
+    """Shared fixtures for the wine endpoint tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name='Chile')
+        cls.city = City.objects.create(name='Santiago', country_id=country.id)
+        cls.provider = User.objects.create_user(
+            username='provider', password='secret', role='provider',
+            name='Vina Test', identifier_number='P-001',
+        )
+        cls.client_user = User.objects.create_user(
+            username='client', password='secret', role='client',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # cached listings are keyed on a catalog version that only moves on commit
+
+    def create_wines(self, count, **kwargs):
+        wines = []
+        for i in range(count):
+            attribute = Attribute.objects.create(**ATTRIBUTE_DATA)
+            data = {
+                'name': f'Wine {i}',
+                'harvest_year': 2000 + i % 5,
+                'maker': 'Maker',
+                'variety': 'Merlot' if i % 2 else 'Syrah',
+                'attribute': attribute,
+                'city': self.city,
+                'provider': self.provider,
+            }
+            data.update(kwargs)
+            wines.append(Wine.objects.create(**data))
+        return wines
+
+
+class WineQueryCountTests(WineTestMixin, TestCase):
+    """Every wine read path must run a fixed number of queries, whatever the row count."""
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+
+    def assertListQueries(self, url, user=None, expected=1):
+        self.api.force_authenticate(user)
+        for count in (1, 10):
+            Wine.objects.all().delete()
+            self.create_wines(count)
+            cache.clear()
+            with self.assertNumQueries(expected):
+                response = self.api.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_public_list(self):
+        self.assertListQueries(reverse('public-wines'))
+
+    def test_client_list(self):
+        self.assertListQueries(reverse('client-wines-list'), self.client_user)
+
+    def test_provider_list(self):
+        # The extra query is the COUNT/MAX(updated_at) aggregate behind the ETag
+        self.assertListQueries(reverse('provider-wines-list'), self.provider, expected=2)
+
+    def test_client_retrieve(self):
+        wine = self.create_wines(1)[0]
+        self.api.force_authenticate(self.client_user)
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('client-wines-detail', args=[wine.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['provider'], 'Vina Test')
+
+    def test_provider_retrieve(self):
+        wine = self.create_wines(1)[0]
+        self.api.force_authenticate(self.provider)
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('provider-wines-detail', args=[wine.id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class WinePaginationTests(WineTestMixin, TestCase):
+    """Keyset cursors over (-harvest_year, name, id), including rows that share the leading keys."""
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.create_wines(12, harvest_year=2010)  # one shared harvest year
+        self.create_wines(3, harvest_year=2011, name='Same name')  # shared (year, name)
+        self.expected = list(Wine.objects.values_list('id', flat=True))
+
+    def walk(self, url, params):
+        ids, sql = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api.get(url, params)
+            params = None  # carried by the next link
+            sql.extend(query['sql'] for query in queries)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids, sql
+
+    def test_pages_follow_the_ordering_without_offset(self):
+        ids, sql = self.walk(reverse('public-wines'), {'page_size': 4, 'fields': 'id'})
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(sql), 4)
+        self.assertFalse([query for query in sql if 'OFFSET' in query.upper()])
+
+    def test_cursors_are_stable_across_inserts_and_go_back(self):
+        url = reverse('public-wines')
+        first = self.api.get(url, {'page_size': 5, 'fields': 'id'}).data
+        self.create_wines(2, harvest_year=2012)  # sorts before the cursor
+        cache.clear()
+        second = self.api.get(first['next']).data
+        self.assertEqual([row['id'] for row in second['results']], self.expected[5:10])
+        back = self.api.get(second['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], self.expected[:5])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.api.get(reverse('public-wines'), {'cursor': 'garbage'}).status_code, 404)
+
+
+class WineSparseFieldsetTests(WineTestMixin, TestCase):
+    """?fields= and ?expand= shape both the payload and the SQL."""
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.create_wines(3)
+
+    def test_fields_skip_unrequested_columns_and_joins(self):
+        url = reverse('public-wines') + '?fields=id,name,variety,harvest_year'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(url)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'variety', 'harvest_year'})
+        sql = queries[0]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('description', sql)
+
+    def test_expand_adds_nested_relations(self):
+        url = reverse('public-wines') + '?fields=id&expand=city,provider'
+        response = self.api.get(url)
+        self.assertEqual(response.data['results'][0]['city'], {'name': 'Santiago', 'country_id': self.city.country_id})
+        self.assertEqual(response.data['results'][0]['provider'], 'Vina Test')
+        self.assertNotIn('attribute', response.data['results'][0])
+
+    def test_no_params_returns_full_payload(self):
+        response = self.api.get(reverse('public-wines'))
+        self.assertEqual(len(response.data['results'][0]), 10)
+
+
+class WineExportTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.create_wines(3)
+
+    def test_ndjson_export(self):
+        response = self.api.get(reverse('wine-export'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['pH'], '3.51')
+
+    def test_csv_export(self):
+        response = self.api.get(reverse('wine-export') + '?output=csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('id,name,'))
+
+    def test_unknown_output(self):
+        response = self.api.get(reverse('wine-export') + '?output=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class WineBulkCreateTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.provider)
+        self.item = {
+            'name': 'Bulk wine',
+            'harvest_year': 2015,
+            'maker': 'Maker',
+            'variety': 'Merlot',
+            'attribute': {field: str(value) for field, value in ATTRIBUTE_DATA.items()},
+            'city_id': self.city.id,
+        }
+
+    def test_valid_rows_are_created_and_invalid_ones_reported(self):
+        data = [self.item] * 20 + [dict(self.item, city_id=9999), dict(self.item, harvest_year=1800)]
+        response = self.api.post(reverse('provider-wines-bulk-create'), data, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 20)
+        self.assertEqual([error['index'] for error in response.data['errors']], [20, 21])
+        self.assertEqual(Wine.objects.filter(provider=self.provider).count(), 20)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.api.post(reverse('provider-wines-bulk-create'), [self.item] * 2, format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.api.post(reverse('provider-wines-bulk-create'), [self.item] * 50, format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_rejects_non_list_payload(self):
+        response = self.api.post(reverse('provider-wines-bulk-create'), self.item, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportWineQualityCommandTests(WineTestMixin, TestCase):
+
+    def test_imports_rows_within_model_ranges(self):
+        header = '"fixed acidity";"volatile acidity";"citric acid";"residual sugar";"chlorides";' \
+                 '"free sulfur dioxide";"total sulfur dioxide";"density";"pH";"sulphates";"alcohol";"quality"\n'
+        rows = [
+            '7.4;0.7;0;1.9;0.076;11;34;0.9978;3.51;0.56;9.4;5\n',
+            '7.8;0.88;0;2.6;0.098;25;67;0.9968;3.2;0.68;9.8;5\n',
+            '7.8;0.88;0;2.6;0.098;25;67;0.9968;3.2;0.68;25.0;5\n',  # alcohol out of range
+            '7.8;abc;0;2.6;0.098;25;67;0.9968;3.2;0.68;9.8;5\n',  # not a number
+            '7.8;0.88;0;2.6;0.098;25;37.5;0.9968;3.2;0.68;9.8;5\n',  # fraction in an integer column
+            '7.8;0.88;0;2.6;0.098;25;67;0.9968;3.2;0.681;9.8;5\n',  # too many decimal places
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(header + ''.join(rows))
+        self.addCleanup(os.remove, handle.name)
+
+        out = io.StringIO()
+        call_command(
+            'import_wine_quality', handle.name, '--city', str(self.city.id), '--harvest-year', '2010',
+            '--provider', self.provider.username, '--batch-size', '3', stdout=out,
+        )
+        self.assertIn('Imported 2 wines, rejected 4 rows', out.getvalue())
+        wine = Wine.objects.select_related('attribute').get(name__endswith=' 2')
+        self.assertEqual(wine.attribute.pH, Decimal('3.20'))
+        self.assertEqual(wine.provider, self.provider)
+
+    def test_rejects_options_the_model_would_reject(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('alcohol\n')
+        self.addCleanup(os.remove, handle.name)
+        invalid = [('--harvest-year', '1800'), ('--name-prefix', 'x' * 99), ('--maker', 'x' * 101)]
+        for option, value in invalid:
+            options = {'--harvest-year': '2010', option: value}
+            arguments = [item for pair in options.items() for item in pair]
+            with self.assertRaisesMessage(CommandError, option):
+                call_command('import_wine_quality', handle.name, '--city', str(self.city.id), *arguments)
+        self.assertFalse(Wine.objects.exists())
+
+
+class WineSimilarityTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        attribute_index.invalidate()
+        self.addCleanup(attribute_index.invalidate)
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.wines = self.create_wines(4)
+        for offset, wine in enumerate(self.wines):
+            wine.attribute.alcohol = Decimal('9.00') + offset
+            wine.attribute.save()
+
+    def test_returns_nearest_wines_first(self):
+        response = self.api.get(reverse('client-wines-similar', args=[self.wines[0].id]) + '?k=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([wine['id'] for wine in response.data], [self.wines[1].id, self.wines[2].id])
+
+    def test_index_follows_attribute_writes(self):
+        self.api.get(reverse('client-wines-similar', args=[self.wines[0].id]))  # build the index
+        with self.captureOnCommitCallbacks(execute=True):
+            attribute = self.wines[3].attribute
+            attribute.alcohol = Decimal('9.00')
+            attribute.save()
+        response = self.api.get(reverse('client-wines-similar', args=[self.wines[0].id]) + '?k=1')
+        self.assertEqual(response.data[0]['id'], self.wines[3].id)
+        self.assertEqual(response.data[0]['distance'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wines[3].attribute.delete()
+        response = self.api.get(reverse('client-wines-similar', args=[self.wines[0].id]) + '?k=10')
+        self.assertNotIn(self.wines[3].id, [wine['id'] for wine in response.data])
+
+    def test_rejects_invalid_k(self):
+        response = self.api.get(reverse('client-wines-similar', args=[self.wines[0].id]) + '?k=0')
+        self.assertEqual(response.status_code, 400)
+
+
+class WineFilterTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.wines = self.create_wines(6)
+        for offset, wine in enumerate(self.wines):
+            wine.attribute.alcohol = Decimal('9.00') + offset
+            wine.attribute.save()
+
+    def test_range_filters(self):
+        response = self.api.get(reverse('public-wines') + '?alcohol__gte=11&variety=Merlot&fields=id')
+        self.assertEqual(
+            {wine['id'] for wine in response.data['results']},
+            {wine.id for wine in self.wines[3::2]},
+        )
+        response = self.api.get(reverse('public-wines') + '?alcohol__range=10,11.5&harvest_year__lte=2002&fields=id')
+        self.assertEqual({wine['id'] for wine in response.data['results']}, {self.wines[1].id, self.wines[2].id})
+
+    def test_invalid_filters(self):
+        for query in ['alcohol__gte=abc', 'pH__range=3.1', 'variety__gte=Merlot', 'alcohol__gte=NaN']:
+            response = self.api.get(reverse('public-wines') + '?' + query)
+            self.assertEqual(response.status_code, 400, query)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+    def test_common_filters_use_indexes(self):
+        cases = {
+            'alcohol__range=12,13': 'attribute_alcohol_idx',
+            'pH__range=3.1,3.4': 'attribute_ph_idx',
+            'residual_sugar__range=1,2': 'attribute_sugar_idx',
+            'variety=Merlot&harvest_year__gte=2001': 'wine_variety_year_idx',
+            'harvest_year__range=2000,2002': 'wine_keyset_idx',
+            f'country={self.city.country_id}': 'locations_city_country_id',
+        }
+        for query, index in cases.items():
+            filters = WineFilterBackend().get_filters(QueryDict(query))
+            plan = Wine.objects.with_related().filter(**filters).explain()
+            self.assertIn(index, plan, query)
+
+
+class WineSearchTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.wines = self.create_wines(4)
+        self.wines[1].description = 'Ripe cherry, cherry jam and a long cherry finish.'
+        self.wines[1].save()
+        self.wines[3].name = 'Cherry Hill'
+        self.wines[3].save()
+
+    def search(self, query):
+        response = self.api.get(reverse('public-wines') + f'?fields=id&q={query}')
+        self.assertEqual(response.status_code, 200)
+        return [wine['id'] for wine in response.data['results']]
+
+    def test_matches_are_ranked_by_relevance(self):
+        self.assertEqual(self.search('cherry'), [self.wines[1].id, self.wines[3].id])
+
+    def test_prefix_and_unsafe_input(self):
+        self.assertEqual(set(self.search('cher')), {self.wines[1].id, self.wines[3].id})
+        self.assertEqual(self.search('%22)(*'), [])
+
+    def test_index_follows_wine_writes(self):
+        self.wines[3].delete()
+        self.wines[0].maker = 'Cherry Estates'
+        self.wines[0].save()
+        self.assertEqual(set(self.search('cherry')), {self.wines[0].id, self.wines[1].id})
+
+    def test_every_match_is_paged_and_scoped(self):
+        self.create_wines(7, description='cherry')
+        ids, url = [], reverse('public-wines') + '?fields=id&q=cherry&page_size=3'
+        while url:
+            response = self.api.get(url)
+            ids.extend(wine['id'] for wine in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(ids), 9)
+        self.assertEqual(len(set(ids)), 9)
+        self.assertEqual(ids[0], self.wines[1].id)
+
+        other = User.objects.create_user(username='other', password='secret', role='provider')
+        mine = self.create_wines(1, provider=other, description='cherry')[0]
+        self.api.force_authenticate(other)
+        response = self.api.get(reverse('provider-wines-list') + '?fields=id&q=cherry')
+        self.assertEqual([wine['id'] for wine in response.data], [mine.id])
+
+
+class WineFacetTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.wines = self.create_wines(4)
+
+    def facet(self, name):
+        response = self.api.get(reverse('wine-facets'))
+        return {entry['value']: entry['count'] for entry in response.data[name]}
+
+    def test_counts_follow_wine_writes(self):
+        self.assertEqual(self.facet('variety'), {'Merlot': 2, 'Syrah': 2})
+        self.wines[0].variety = 'Malbec'
+        self.wines[0].save()
+        self.wines[1].delete()
+        self.assertEqual(self.facet('variety'), {'Merlot': 1, 'Syrah': 1, 'Malbec': 1})
+        self.assertEqual(self.facet('country'), {str(self.city.country_id): 3})
+        self.assertEqual(self.facet('provider'), {str(self.provider.id): 3})
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        Wine.objects.filter(id=self.wines[0].id).update(variety='Malbec')  # bypasses signals
+        with self.assertRaises(CommandError):
+            call_command('rebuild_wine_facets', '--check', stdout=io.StringIO())
+        call_command('rebuild_wine_facets', stdout=io.StringIO())
+        call_command('rebuild_wine_facets', '--check', stdout=io.StringIO())
+        self.assertEqual(self.facet('variety'), {'Merlot': 2, 'Syrah': 1, 'Malbec': 1})
+
+
+class WineListCacheTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.wines = self.create_wines(3)
+        self.url = reverse('public-wines') + '?fields=id,name'
+
+    def test_etag_and_cached_responses_skip_the_database(self):
+        etag = self.api.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.api.get(self.url)
+            self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_bump_the_catalog_version(self):
+        etag = self.api.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wines[0].name = 'Renamed'
+            self.wines[0].save()
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', [wine['name'] for wine in response.data['results']])
+
+
+class WineDetailCacheTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.wine = self.create_wines(1)[0]
+        self.url = reverse('client-wines-detail', args=[self.wine.id])
+
+    def test_hits_skip_the_database_and_respect_fields(self):
+        self.api.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.api.get(self.url + '?fields=id,name')
+        self.assertEqual(response.data, {'id': self.wine.id, 'name': self.wine.name})
+        self.assertEqual(get_detail_stats(), {'hits': 1, 'misses': 1})
+
+    def test_hits_check_object_permissions(self):
+        self.api.get(self.url)
+        with mock.patch.object(IsClient, 'has_object_permission', return_value=False) as check:
+            response = self.api.get(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(check.call_args.args[2].id, self.wine.id)
+        self.assertEqual(get_detail_stats(), {'hits': 1, 'misses': 1})
+
+    def test_related_writes_invalidate_the_entry(self):
+        self.api.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wine.attribute.pH = Decimal('3.00')
+            self.wine.attribute.save()
+        self.assertEqual(self.api.get(self.url).data['attribute']['pH'], '3.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = 'Valparaiso'
+            self.city.save()
+        self.assertEqual(self.api.get(self.url).data['city']['name'], 'Valparaiso')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.name = 'Vina Nueva'
+            self.provider.save()
+        self.assertEqual(self.api.get(self.url).data['provider'], 'Vina Nueva')
+
+
+class WineConditionalGetTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.provider)
+        self.wines = self.create_wines(2)
+        self.wine = self.wines[0]
+
+    def test_list_and_detail_validators(self):
+        for url in (reverse('provider-wines-list'), reverse('provider-wines-detail', args=[self.wine.id])):
+            response = self.api.get(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_list_deletes_are_seen_by_the_etag_only(self):
+        url = reverse('provider-wines-list')
+        response = self.api.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.wines[1].delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+    def test_serialized_relations_are_in_the_detail_validators(self):
+        User.objects.filter(pk=self.provider.pk).update(city=self.city)
+        self.api.force_authenticate(self.client_user)
+        url = reverse('providers-detail', args=[self.provider.id])
+        etag = self.api.get(url)['ETag']
+        self.city.name = 'Valparaiso'
+        self.city.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['city'], 'Valparaiso')
+
+    def test_related_writes_change_the_etag(self):
+        url = reverse('provider-wines-detail', args=[self.wine.id])
+        etag = self.api.get(url)['ETag']
+        Attribute.objects.filter(id=self.wine.attribute_id).update(updated_at=self.wine.updated_at.replace(year=2100))
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class WineChangesFeedTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.url = reverse('client-wines-changes')
+
+    def test_feed_returns_deltas_and_tombstones(self):
+        first, second = self.create_wines(2)
+        cursor = self.api.get(self.url).data['next_cursor']
+
+        first.attribute.pH = Decimal('3.00')
+        first.attribute.save()
+        second_id = second.id
+        second.delete()
+        self.create_wines(1, name='New wine')
+
+        with self.assertNumQueries(2):
+            data = self.api.get(self.url, {'since': cursor}).data
+        changes = [(change['wine_id'], change['action']) for change in data['results']]
+        self.assertEqual(changes[:2], [(first.id, 'updated'), (second_id, 'deleted')])
+        self.assertEqual(changes[2][1], 'created')
+        self.assertEqual(data['results'][0]['wine']['attribute']['pH'], '3.00')
+        self.assertIsNone(data['results'][1]['wine'])
+        self.assertEqual(self.api.get(self.url, {'since': data['next_cursor']}).data['results'], [])
+
+    def test_pages_follow_the_cursor(self):
+        self.create_wines(5)
+        data = self.api.get(self.url, {'limit': 3}).data
+        self.assertTrue(data['has_more'])
+        data = self.api.get(self.url, {'limit': 3, 'since': data['next_cursor']}).data
+        self.assertEqual(len(data['results']), 2)
+        self.assertFalse(data['has_more'])
+        self.assertEqual(WineChange.objects.count(), 5)
+        self.assertEqual(self.api.get(self.url, {'since': 'x'}).status_code, 400)
+
+    def test_feed_holds_back_at_recent_gaps(self):
+        self.create_wines(4)
+        changes = list(WineChange.objects.values_list('id', flat=True))
+        WineChange.objects.filter(id=changes[2]).delete()  # id allocated by a transaction still open
+        data = self.api.get(self.url).data
+        self.assertEqual([change['cursor'] for change in data['results']], changes[:2])
+        self.assertEqual(data['next_cursor'], changes[1])
+        self.assertFalse(data['has_more'])
+
+        WineChange.objects.filter(id=changes[3]).update(changed_at=timezone.now() - GAP_GRACE * 2)
+        data = self.api.get(self.url, {'since': data['next_cursor']}).data
+        self.assertEqual([change['cursor'] for change in data['results']], changes[3:])
+
+
+class WineStatsTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.wines = self.create_wines(4)
+        self.url = reverse('wine-stats')
+
+    def test_stats_per_group(self):
+        with self.assertNumQueries(1):
+            data = self.api.get(self.url).data
+        groups = {group['value']: group for group in data['groups']}
+        self.assertEqual({value: group['count'] for value, group in groups.items()}, {'Merlot': 2, 'Syrah': 2})
+        alcohol = groups['Merlot']['measurements']['alcohol']
+        self.assertEqual((alcohol['mean'], alcohol['std'], alcohol['p50']), (9.4, 0.0, 9.4))
+        self.assertEqual(sum(alcohol['histogram']), 2)
+        self.assertEqual(len(data['bins']['alcohol']), len(alcohol['histogram']) + 1)
+        by_year = self.api.get(self.url, {'group_by': 'harvest_year'}).data
+        self.assertEqual([group['value'] for group in by_year['groups']], [2000, 2001, 2002, 2003])
+        self.assertEqual(self.api.get(self.url, {'group_by': 'maker'}).status_code, 400)
+
+    def test_results_are_cached_until_an_attribute_changes(self):
+        self.api.get(self.url)
+        with self.assertNumQueries(0):
+            self.api.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            attribute = self.wines[1].attribute
+            attribute.alcohol = Decimal('12.40')
+            attribute.save()
+        groups = {group['value']: group for group in self.api.get(self.url).data['groups']}
+        self.assertEqual(groups['Merlot']['measurements']['alcohol']['max'], 12.4)
+
+
+class AttributeSnapshotTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.wines = self.create_wines(3)
+
+    def test_columns_are_memory_mapped_and_reloaded_on_new_versions(self):
+        with override_settings(WINE_SNAPSHOT_DIR=self.directory):
+            call_command('build_wine_snapshot', stdout=io.StringIO())
+            snapshot = AttributeSnapshot()
+            alcohol = snapshot.column('alcohol')
+            self.assertIsInstance(alcohol, np.memmap)
+            self.assertFalse(alcohol.flags.writeable)
+            self.assertEqual(list(snapshot.column('wine_id')), [wine.id for wine in self.wines])
+            self.assertEqual(float(alcohol[0]), 9.4)
+
+            Attribute.objects.create(**ATTRIBUTE_DATA)  # no wine yet
+            version = snapshot.version
+            call_command('build_wine_snapshot', stdout=io.StringIO())
+            snapshot.check_interval = 0
+            self.assertNotEqual(snapshot.version, version)
+            self.assertEqual(int(snapshot.column('wine_id')[-1]), -1)
+            self.assertEqual(len(snapshot.measurements()['pH']), 4)
+            self.assertAlmostEqual(snapshot.built_at.timestamp(), int(snapshot.version) / 1e9, places=5)
+
+    def test_similarity_overlays_later_writes_on_the_snapshot(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        attribute_index.invalidate()
+        self.addCleanup(attribute_index.invalidate)
+        wines = self.wines + self.create_wines(1)
+        for offset, wine in enumerate(wines):
+            Attribute.objects.filter(pk=wine.attribute_id).update(
+                alcohol=Decimal('9.00') + offset, updated_at=timezone.now() - timedelta(days=1),
+            )
+        url = reverse('client-wines-similar', args=[wines[0].id]) + '?k=10'
+        with override_settings(WINE_SNAPSHOT_DIR=self.directory):
+            call_command('build_wine_snapshot', stdout=io.StringIO())
+            attribute = Attribute.objects.get(pk=wines[2].attribute_id)
+            attribute.alcohol = Decimal('9.00')
+            attribute.save()
+            wines[1].attribute.delete()
+            newer = self.create_wines(1)[0]  # alcohol 9.40
+
+            for _ in range(2):  # the overlay is read again on every rebuild
+                response = api.get(url)
+                self.assertEqual([wine['id'] for wine in response.data], [wines[2].id, newer.id, wines[3].id])
+                self.assertIsInstance(attribute_index._columns[0], np.memmap)
+                attribute_index.invalidate()
+
+
+class NumericAttributeTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.wine = self.create_wines(1)[0]
+
+    def test_opt_in_returns_json_numbers(self):
+        for url in (reverse('public-wines'), reverse('client-wines-detail', args=[self.wine.id])):
+            default = self.api.get(url).json()
+            numeric = self.api.get(url, {'decimals': 'number'}).json()
+            if 'results' in default:
+                default, numeric = default['results'][0], numeric['results'][0]
+            self.assertEqual(default['attribute']['density'], '0.99780')
+            self.assertEqual(numeric['attribute']['density'], 0.9978)
+            self.assertEqual(numeric['attribute']['total_sulfur_dioxide'], 34)
+            self.assertEqual(
+                {name: Decimal(str(value)) for name, value in numeric['attribute'].items()},
+                {name: Decimal(value) for name, value in default['attribute'].items() if name != 'id'} | {'id': self.wine.attribute_id},
+            )
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_attribute_serializer', rows=50, repeat=1, stdout=out)
+        self.assertIn('faster', out.getvalue())
+
+
+class WineCompareTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.wines = self.create_wines(4)
+        for wine, alcohol in zip(self.wines, ['9.00', '10.00', '11.00', '12.00']):
+            wine.attribute.alcohol = Decimal(alcohol)
+            wine.attribute.save()
+        self.url = reverse('client-wines-compare')
+
+    def test_scores_against_the_variety(self):
+        ids = [wine.id for wine in self.wines]
+        with self.assertNumQueries(2):
+            results = self.api.post(self.url, {'ids': ids}, format='json').data
+        self.assertEqual([result['id'] for result in results], ids)
+        syrah = [result['measurements']['alcohol'] for result in results if result['variety'] == 'Syrah']
+        self.assertEqual([(m['value'], m['z_score'], m['percentile']) for m in syrah], [(9.0, -1.0, 25.0), (11.0, 1.0, 75.0)])
+        self.assertEqual(results[0]['measurements']['pH']['z_score'], 0.0)
+        self.assertEqual(results[0]['baseline_count'], 2)
+        with self.assertNumQueries(1):  # distributions are cached
+            self.api.post(self.url, {'ids': ids[:1]}, format='json')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.api.post(self.url, {'ids': [9999]}, format='json').status_code, 400)
+        self.assertEqual(self.api.post(self.url, {'ids': list(range(51))}, format='json').status_code, 400)
+        self.assertEqual(self.api.post(self.url, {'ids': 'x'}, format='json').status_code, 400)
+        self.assertEqual(self.api.post(self.url, {'ids': [True]}, format='json').status_code, 400)
+
+    def test_baselines_are_cached_as_quantiles_under_hashed_keys(self):
+        for wine in self.wines:
+            wine.variety = 'Cabernet Sauvignon / Côt'  # spaces and non-ASCII: not a valid memcached key
+            wine.save()
+        results = self.api.post(self.url, {'ids': [self.wines[0].id]}, format='json').data
+        self.assertEqual(results[0]['measurements']['alcohol']['percentile'], 12.5)
+        keys = [key for key in cache._cache if 'variety-distribution' in key]
+        self.assertEqual(len(keys), 1)
+        self.assertNotIn('Cabernet', keys[0])
+        self.assertEqual(cache.get(keys[0].split(':', 2)[-1])['quantiles'].shape, (101, len(Attribute.MEASUREMENT_FIELDS)))
+
+
+class ProviderDashboardTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.provider)
+        self.wines = self.create_wines(4)
+        self.url = reverse('provider-wines-dashboard')
+
+    def test_summary_in_fixed_queries_and_invalidated_on_writes(self):
+        collection = ProviderCollection.objects.create(collection_name='Reds', description='', provider=self.provider)
+        for wine in self.wines[:2]:
+            ProviderCollectionWine.objects.create(provider_collection=collection, wine=wine)
+        client_collection = ClientCollection.objects.create(collection_name='Mine', description='', client=self.client_user)
+        ClientCollectionWine.objects.create(client_collection=client_collection, wine=self.wines[0])
+
+        with self.assertNumQueries(4):
+            data = self.api.get(self.url).data
+        self.assertEqual(data['wines']['total'], 4)
+        self.assertEqual(data['wines']['by_variety'], [{'variety': 'Merlot', 'count': 2}, {'variety': 'Syrah', 'count': 2}])
+        self.assertEqual(data['provider_collections'], {'collections': 1, 'wines': 2})
+        self.assertEqual(data['client_collections'], {'collections': 1, 'wines': 1})
+        self.assertEqual(data['comments']['total'], 0)
+        with self.assertNumQueries(0):
+            self.api.get(self.url)
+
+        self.api.force_authenticate(self.client_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(reverse('wine-comment-list'), {'wine': self.wines[1].id, 'comment': 'Great wine'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(WineComment.objects.get().client, self.client_user)
+        self.api.force_authenticate(self.provider)
+        self.assertEqual(self.api.get(self.url).data['comments'], {'total': 1, 'wines': 1, 'clients': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_wines(1)
+        self.assertEqual(self.api.get(self.url).data['wines']['total'], 5)
+
+    def test_clients_are_rejected(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(self.url).status_code, 403)
+
+
+class WineBulkUpdateTests(WineTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.provider)
+        self.url = reverse('provider-wines-bulk-update')
+
+    def test_changes_are_applied_and_foreign_ids_rejected(self):
+        wines = self.create_wines(4)
+        other = User.objects.create_user(username='other', password='secret', role='provider')
+        foreign = self.create_wines(1, provider=other)[0]
+        data = [{'id': wine.id, 'variety': 'Malbec', 'attribute': {'pH': '3.20'}} for wine in wines[:3]]
+        data += [{'id': foreign.id, 'variety': 'Malbec'}, {'id': wines[3].id, 'harvest_year': 1800}]
+
+        response = self.api.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['updated'], [wine.id for wine in wines[:3]])
+        self.assertEqual([error['index'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(Wine.objects.filter(variety='Malbec').count(), 3)
+        self.assertEqual(Attribute.objects.filter(pH=Decimal('3.20')).count(), 3)
+        self.assertEqual(Wine.objects.get(id=foreign.id).variety, 'Syrah')
+        self.assertEqual(WineChange.objects.filter(action='updated').count(), 3)
+        malbec = self.api.get(reverse('wine-facets')).data['variety']
+        self.assertIn({'value': 'Malbec', 'count': 3}, malbec)
+
+    def test_duplicate_ids_and_string_city_ids(self):
+        wine = self.create_wines(1)[0]
+        data = [{'id': wine.id, 'name': 'A', 'city_id': str(self.city.id)}, {'id': wine.id, 'variety': 'X'}]
+        response = self.api.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['updated'], [wine.id])
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'id': ['Duplicate id in the batch.']}}])
+        wine.refresh_from_db()
+        self.assertEqual((wine.name, wine.variety), ('A', 'Syrah'))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        counts = []
+        for size in (2, 20):
+            wines = self.create_wines(size)
+            data = [{'id': wine.id, 'description': 'Updated'} for wine in wines]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api.patch(self.url, data, format='json')
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
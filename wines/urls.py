@@ -9,4 +9,8 @@ router.register(r'client-wines', views.WineClientViewSet, 'client-wines')
 urlpatterns = [
     path("api/v1/", include(router.urls)),
     path("api/v1/public-wines/", views.WinePublicListView.as_view(), name='public-wines'),
+    path("api/v1/export/", views.WineExportView.as_view(), name='wine-export'),
+    path("api/v1/facets/", views.WineFacetView.as_view(), name='wine-facets'),
+    path("api/v1/stats/", views.WineStatsView.as_view(), name='wine-stats'),
+    path("api/v1/cache-stats/", views.WineCacheStatsView.as_view(), name='wine-cache-stats'),
 ]
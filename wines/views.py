@@ -1,20 +1,46 @@
 
-from rest_framework import viewsets, generics
-from rest_framework.permissions import AllowAny
+import hashlib
 
-from .models import Wine
-from .serializer import (WineReadSerializer, WineWriteSerializer)
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+
+from wine_collection_api.conditional import ConditionalGetMixin
+from .models import Wine, WineFacetCount, WineChange
+from .serializer import (WineReadSerializer, WineWriteSerializer, WineBulkItemSerializer,
+                         WineBulkUpdateItemSerializer)
 from .permissions import IsClient, IsProvider, IsProviderWineOwner
+from .pagination import WineCursorPagination
+from .export import export_rows, stream_csv, stream_ndjson
+from .similarity import attribute_index
+from .filters import WineFilterBackend, WineSearchFilter
+from .facets import FACETS
+from .caching import CatalogCacheMixin, WineDetailCacheMixin, get_catalog_version, get_detail_stats
+from .changes import changes_since, live_wines
+from .stats import GROUPS, compare_wines, measurement_stats
+from .dashboard import get_provider_dashboard
 
-class WineProviderViewSet(viewsets.ModelViewSet):
+class WineProviderViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for providers to manage their own wines.
     """
     serializer_class = WineReadSerializer
+    last_modified_fields = ['updated_at', 'attribute__updated_at', 'city__updated_at', 'provider__updated_at']
+    filter_backends = [WineFilterBackend, WineSearchFilter]
+    bulk_create_limit = 10000
+    bulk_update_limit = 1000
     
     def get_queryset(self):
         """Get queryset for providers wines."""
-        return Wine.objects.filter(provider=self.request.user)
+        if self.action in ['list', 'retrieve']:
+            queryset = Wine.objects.for_fields(WineReadSerializer.get_selected_fields(self.request))
+        else:
+            queryset = Wine.objects.with_related()
+        return queryset.filter(provider=self.request.user)
     
     def get_permissions(self):
         if self.action in ['list', 'create']:
@@ -28,24 +54,238 @@ class WineProviderViewSet(viewsets.ModelViewSet):
         if self.action in ['create', 'update', 'partial_update']:
             return WineWriteSerializer
         return WineReadSerializer
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Wine counts by variety and harvest year, collections holding the provider's
+        wines and comments on them. Cached per provider until one of those changes.
+        """
+        return Response(get_provider_dashboard(request.user.id))
+
+    @action(detail=False, methods=['post'], url_path='bulk-create')
+    def bulk_create(self, request):
+        """
+        Create many wines in one request.
+        Valid items are inserted in a single transaction; invalid ones are reported by index.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({'detail': 'Expected a list of wines.'})
+        if len(request.data) > self.bulk_create_limit:
+            raise ValidationError({'detail': f'At most {self.bulk_create_limit} wines per request.'})
+
+        wines, errors = WineBulkItemSerializer.bulk_create(request.data, request.user)
+        if not wines and errors:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'created': [wine.id for wine in wines], 'errors': errors}, status=response_status)
+
+    @action(detail=False, methods=['patch'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Partially update many of the provider's wines: a list of {"id": ..., <changed fields>}.
+        Valid items are written in a single transaction; invalid or foreign ids are reported by index.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({'detail': 'Expected a list of wines.'})
+        if len(request.data) > self.bulk_update_limit:
+            raise ValidationError({'detail': f'At most {self.bulk_update_limit} wines per request.'})
+
+        wines, errors = WineBulkUpdateItemSerializer.bulk_update(request.data, request.user)
+        if not wines and errors:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'updated': [wine.id for wine in wines], 'errors': errors}, status=response_status)
     
-class WineClientViewSet(viewsets.ReadOnlyModelViewSet):
+class WineClientViewSet(CatalogCacheMixin, WineDetailCacheMixin, viewsets.ReadOnlyModelViewSet):
     """View set for clients to view wines."""
     serializer_class = WineReadSerializer
+    pagination_class = WineCursorPagination
+    filter_backends = [WineFilterBackend, WineSearchFilter]
+    max_similar = 100
+    changes_page_size = 500
+    max_changes_page_size = 1000
+    max_compared = 50
     
     def get_queryset(self):
-        """Get queryset for wines."""
-        return Wine.objects.all()
+        """Get queryset for wines. Retrieve fills the detail cache, which needs the full row."""
+        if self.action == 'retrieve':
+            return Wine.objects.with_related()
+        return Wine.objects.for_fields(WineReadSerializer.get_selected_fields(self.request))
     
     def get_permissions(self):
         """Get permissions based on action."""
         if self.action in ['list', 'retrieve']:
             return [ IsClient()]
         return [IsClient()]
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Wines with the closest normalized chemical attributes, nearest first (?k=, default 20)."""
+        try:
+            k = int(request.query_params.get('k', 20))
+        except ValueError:
+            raise ValidationError({'k': 'Must be an integer.'})
+        if not 1 <= k <= self.max_similar:
+            raise ValidationError({'k': f'Must be between 1 and {self.max_similar}.'})
+
+        wine = self.get_object()
+        neighbours = attribute_index.nearest(wine.attribute_id, k)
+        distances = dict(neighbours)
+        wines = {w.attribute_id: w for w in self.get_queryset().filter(attribute_id__in=distances)}
+        results = []
+        for attribute_id, distance in neighbours:
+            if attribute_id in wines:
+                data = self.get_serializer(wines[attribute_id]).data
+                data['distance'] = round(distance, 6)
+                results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['post'])
+    def compare(self, request):
+        """
+        Compare up to 50 wines ({"ids": [...]}) against their variety: every measurement
+        comes with its z-score and percentile rank among the wines of the same variety.
+        """
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(wine_id, int) and not isinstance(wine_id, bool) for wine_id in ids):
+            raise ValidationError({'ids': 'Expected a list of wine ids.'})
+        if not 1 <= len(ids) <= self.max_compared:
+            raise ValidationError({'ids': f'Compare between 1 and {self.max_compared} wines.'})
+
+        wines = Wine.objects.select_related('attribute').in_bulk(ids)
+        missing = [wine_id for wine_id in ids if wine_id not in wines]
+        if missing:
+            raise ValidationError({'ids': f'Unknown wine ids: {missing}.'})
+        return Response(compare_wines([wines[wine_id] for wine_id in dict.fromkeys(ids)]))
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Wines created, updated or deleted after ?since= (a cursor from a previous call, 0 for the
+        whole log), oldest first and at most one entry per wine. Deleted wines come back as
+        tombstones with a null payload. Keep calling with next_cursor while has_more is true.
+        The feed holds back behind ids that may belong to a transaction still in flight.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', self.changes_page_size))
+        except ValueError:
+            raise ValidationError({'detail': 'since and limit must be integers.'})
+        if since < 0:
+            raise ValidationError({'since': 'Must not be negative.'})
+        if not 1 <= limit <= self.max_changes_page_size:
+            raise ValidationError({'limit': f'Must be between 1 and {self.max_changes_page_size}.'})
+
+        changes, next_cursor, has_more = changes_since(since, limit)
+        wines = live_wines(changes)
+        results = []
+        for change in changes:
+            wine = wines.get(change.wine_id)
+            results.append({
+                'cursor': change.id,
+                'wine_id': change.wine_id,
+                'action': change.action if wine else WineChange.DELETED,  # deleted after this entry
+                'changed_at': change.changed_at,
+                'wine': self.get_serializer(wine).data if wine else None,
+            })
+        return Response({'results': results, 'next_cursor': next_cursor, 'has_more': has_more})
     
-class WinePublicListView(generics.ListAPIView):
+class WinePublicListView(CatalogCacheMixin, generics.ListAPIView):
     """Public view to list wines."""
-    queryset = Wine.objects.all()
     serializer_class = WineReadSerializer
+    pagination_class = WineCursorPagination
+    filter_backends = [WineFilterBackend, WineSearchFilter]
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        """Get queryset limited to the requested fields."""
+        return Wine.objects.for_fields(WineReadSerializer.get_selected_fields(self.request))
+
+
+class WineExportView(generics.GenericAPIView):
+    """
+    Stream the whole wine catalog with its attributes as NDJSON (default) or CSV.
+    Use ?output=csv for CSV. Rows are read in chunks, so memory stays flat.
+    """
+    permission_classes = [IsAuthenticated]
+    filter_backends = [WineFilterBackend, WineSearchFilter]
+    chunk_size = 2000
+    outputs = {
+        'ndjson': (stream_ndjson, 'application/x-ndjson'),
+        'csv': (stream_csv, 'text/csv'),
+    }
+
+    def get_queryset(self):
+        return Wine.objects.order_by('id')
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.outputs:
+            raise ValidationError({'output': f"Must be one of: {', '.join(self.outputs)}."})
+
+        stream, content_type = self.outputs[output]
+        rows = export_rows(self.filter_queryset(self.get_queryset()), self.chunk_size)
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="wines.{output}"'
+        return response
+
+
+class WineFacetView(generics.GenericAPIView):
+    """
+    Public wine counts per variety, harvest year, country and provider.
+    Reads the incrementally maintained WineFacetCount table instead of running GROUP BY queries.
+    """
     permission_classes = [AllowAny]
-                
\ No newline at end of file
+
+    def get_queryset(self):
+        return WineFacetCount.objects.filter(count__gt=0).order_by('facet', '-count', 'value')
+
+    def get(self, request, *args, **kwargs):
+        facets = {facet: [] for facet in FACETS}
+        for facet, value, count in self.get_queryset().values_list('facet', 'value', 'count'):
+            if facet in facets:
+                facets[facet].append({'value': value, 'count': count})
+        return Response(facets)
+
+
+class WineStatsView(generics.GenericAPIView):
+    """
+    Per-variety (default) or per-harvest-year statistics of every Attribute measurement:
+    mean, std, min, max, p10/p50/p90 and a fixed-bin histogram. Use ?group_by=harvest_year;
+    the wine filters apply. Results are cached per catalog version, so attribute writes invalidate them.
+    """
+    permission_classes = [AllowAny]
+    filter_backends = [WineFilterBackend]
+    cache_timeout = 3600
+
+    def get_queryset(self):
+        return Wine.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        group_by = request.query_params.get('group_by', 'variety')
+        if group_by not in GROUPS:
+            raise ValidationError({'group_by': f"Must be one of: {', '.join(GROUPS)}."})
+
+        parts = [sorted(request.query_params.lists()), get_catalog_version()]
+        key = 'wines:stats:' + hashlib.sha256(repr(parts).encode()).hexdigest()
+        data = cache.get(key)
+        if data is None:
+            data = measurement_stats(self.filter_queryset(self.get_queryset()), group_by)
+            cache.set(key, data, self.cache_timeout)
+        return Response(data)
+
+
+class WineCacheStatsView(generics.GenericAPIView):
+    """Hit and miss counters of the per-wine payload cache (staff only)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_detail_stats())
+